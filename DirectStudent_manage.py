@@ -2,12 +2,23 @@
 
 import streamlit as st
 import requests
+import pandas as pd
 import json
-import re # Import regex for parsing IDs from display strings
+import orjson
+import time
+from collections import defaultdict
 
 # --- Configuration ---
 #API_BASE_URL = "http://localhost:5002"
-from config import API_BASE_URL
+from config import API_BASE_URL, DEBUG
+from api_session import get_http_session, API_TIMEOUT, fetch_in_parallel, caches_endpoint
+
+# Seconds a session keeps its fetched student list before refetching
+STUDENTS_CACHE_TTL = 60
+
+# endpoint -> (conditional request headers, last payload) for GETs whose
+# responses carried an ETag/Last-Modified, so unchanged data comes back as a 304.
+_CONDITIONAL_GET_CACHE = {}
 
 
 # --- API Interaction Functions ---
@@ -18,32 +29,49 @@ def direct_api_call(method, endpoint, payload=None):
     
     try:
         # st.markdown(f"**DEBUG API CALL:** Method={method}, Endpoint={endpoint}, Payload={payload}")
-        print(f"DEBUG API CALL: Method={method}, Endpoint={endpoint}, Payload={payload}")
-        if method == 'GET':
-            response = requests.get(url, headers=headers)
-        elif method == 'POST':
-            response = requests.post(url, headers=headers, data=json.dumps(payload))
-        elif method == 'PUT':
-            response = requests.put(url, headers=headers, data=json.dumps(payload))
-        elif method == 'DELETE':
-            response = requests.delete(url, headers=headers)
-        else:
+        if DEBUG:
+            print(f"DEBUG API CALL: Method={method}, Endpoint={endpoint}, Payload={payload}")
+        if method not in ('GET', 'POST', 'PUT', 'DELETE'):
             return 400, {"message": "Unsupported HTTP method"}
+        cached_get = _CONDITIONAL_GET_CACHE.get(endpoint) if method == 'GET' else None
+        if cached_get:
+            headers.update(cached_get[0])
+        response = get_http_session().request(
+            method,
+            url,
+            headers=headers,
+            data=orjson.dumps(payload) if method in ('POST', 'PUT') else None,
+            timeout=API_TIMEOUT
+        )
+
+        if response.status_code == 304 and cached_get:
+            return 200, cached_get[1]
 
         if response.status_code == 204:
             # st.markdown(f"**DEBUG API RESPONSE:** Status=204 (No Content) for {endpoint}")
-            print(f"DEBUG API RESPONSE: Status=204 (No Content) for {endpoint}")
+            if DEBUG:
+                print(f"DEBUG API RESPONSE: Status=204 (No Content) for {endpoint}")
             return response.status_code, {}
 
         try:
-            data = response.json()
+            data = orjson.loads(response.content)
             # st.markdown(f"**DEBUG API RESPONSE:** Status={response.status_code}, Data={data} for {endpoint}")
-            print(f"DEBUG API RESPONSE: Status={response.status_code}, Data={data} for {endpoint}")
-        except json.JSONDecodeError:
+            if DEBUG:
+                print(f"DEBUG API RESPONSE: Status={response.status_code}, Data={data} for {endpoint}")
+        except orjson.JSONDecodeError:
             # st.markdown(f"**DEBUG: JSONDecodeError** for {method} {url}. Raw response content: '{response.text}'")
             print(f"DEBUG: JSONDecodeError for {method} {url}. Raw response content: '{response.text}'")
             return response.status_code, {"message": f"Invalid JSON response from API: {response.text}"}
 
+        if method == 'GET' and response.status_code == 200:
+            validators = {}
+            if response.headers.get('ETag'):
+                validators['If-None-Match'] = response.headers['ETag']
+            if response.headers.get('Last-Modified'):
+                validators['If-Modified-Since'] = response.headers['Last-Modified']
+            if validators:
+                _CONDITIONAL_GET_CACHE[endpoint] = (validators, data)
+
         return response.status_code, data
 
     except requests.exceptions.ConnectionError:
@@ -63,15 +91,29 @@ def direct_api_call(method, endpoint, payload=None):
         return 500, {"message": f"API request error: {e}"}
 
 
-@st.cache_data(ttl=60)
 def fetch_all_students_direct():
+    """Fetches all students, cached per browser session for STUDENTS_CACHE_TTL seconds.
+
+    Unlike the shared reference data below, the student list lives in st.session_state so one
+    user's add/update/delete doesn't invalidate every other session's cache. The trade-off is
+    one copy of the list per active session.
+    """
+    cached = st.session_state.get('direct_students_cache')
+    if cached and time.monotonic() - cached[0] < STUDENTS_CACHE_TTL:
+        return cached[1]
     status, data = direct_api_call('GET', '/students')
     if status == 200:
+        st.session_state.direct_students_cache = (time.monotonic(), data)
         return data
     st.error(f"Failed to fetch students directly: {data.get('message', 'Unknown error')}")
     return []
 
-@st.cache_data(ttl=60)
+def clear_students_cache():
+    """Drops this session's cached student list so the next fetch hits the API."""
+    st.session_state.pop('direct_students_cache', None)
+
+@caches_endpoint('/gurukul')
+@st.cache_data(ttl=60, show_spinner=False)
 def fetch_all_gurukuls():
     status, data = direct_api_call('GET', '/gurukul')
     if status == 200:
@@ -79,25 +121,21 @@ def fetch_all_gurukuls():
     st.error(f"Failed to fetch gurukuls: {data.get('message', 'Unknown error')}")
     return []
 
-@st.cache_data(ttl=60)
-def fetch_milestones_by_gurukul(gid):
-    if gid is None:
-        return []
-    status, data = direct_api_call('GET', f'/milestones/by-gurukul/{gid}')
-    if status == 200:
-        return data
-    st.error(f"Failed to fetch milestones for Gurukul ID {gid}: {data.get('message', 'Unknown error')}")
-    return []
-
-@st.cache_data(ttl=60)
+@caches_endpoint('/milestones')
+@st.cache_data(ttl=60, show_spinner=False)
 def fetch_all_milestones():
+    """Fetches all milestones, with their selectbox and table labels formatted once per fetch."""
     status, data = direct_api_call('GET', '/milestones')
     if status == 200:
+        for m in data:
+            m['label'] = f"Level {m['level']} (Class: {m['class']}, ID: {m['mid']})"
+            m['short_label'] = f"Level {m.get('level', 'N/A')} (Class {m.get('class', 'N/A')})"
         return data
     st.error(f"Failed to fetch all milestones: {data.get('message', 'Unknown error')}")
     return []
 
-@st.cache_data(ttl=60)
+@caches_endpoint('/gurukul-offerings')
+@st.cache_data(ttl=60, show_spinner=False)
 def fetch_all_offerings():
     status, data = direct_api_call('GET', '/gurukul-offerings')
     if status == 200:
@@ -105,56 +143,67 @@ def fetch_all_offerings():
     st.error(f"Failed to fetch all offerings: {data.get('message', 'Unknown error')}")
     return []
 
-
-def initialize_direct_student_crud_states():
+@caches_endpoint('/gurukul-offerings', '/milestones')
+@st.cache_data(ttl=60, show_spinner=False)
+def get_milestones_grouped_by_gurukul():
+    """Groups all milestones by their offering's gid, so per-gurukul lookups need no extra API call."""
+    offering_id_to_gid_map = {o['oid']: o.get('gid') for o in fetch_all_offerings()}
+    milestones_by_gid = defaultdict(list)
+    for m in fetch_all_milestones():
+        gid = offering_id_to_gid_map.get(m['oid'])
+        if gid:
+            milestones_by_gid[gid].append(m)
+    return dict(milestones_by_gid)
+
+@caches_endpoint('/gurukul', '/gurukul-offerings', '/milestones')
+@st.cache_data(ttl=60, show_spinner=False)
+def get_gurukul_name_to_id():
+    """Returns {gname: gid} for the gurukuls that have at least one milestone, in API order."""
+    milestones_by_gid = get_milestones_grouped_by_gurukul()
+    return {g['gname']: g['gid'] for g in fetch_all_gurukuls() if g['gid'] in milestones_by_gid}
+
+@caches_endpoint('/gurukul-offerings', '/milestones')
+@st.cache_data(ttl=60, show_spinner=False)
+def get_milestone_options_by_gurukul(gid):
+    """Returns a {display label: mid} map of a gurukul's milestones for the milestone selectboxes."""
+    return {m['label']: m['mid'] for m in get_milestones_grouped_by_gurukul().get(gid, [])}
+
+# Session state defaults for the direct student CRUD page
+DIRECT_STUDENT_CRUD_STATE_DEFAULTS = {
     # Add form states for new student
-    if 'direct_add_student_name_input_val' not in st.session_state:
-        st.session_state.direct_add_student_name_input_val = ""
-    if 'direct_add_student_email_input_val' not in st.session_state:
-        st.session_state.direct_add_student_email_input_val = "" 
-    if 'direct_selected_add_student_gurukul_name' not in st.session_state:
-        st.session_state.direct_selected_add_student_gurukul_name = ""
-    if 'direct_selected_add_student_gurukul_id' not in st.session_state:
-        st.session_state.direct_selected_add_student_gurukul_id = None
-    if 'direct_selected_add_student_milestone_name' not in st.session_state:
-        st.session_state.direct_selected_add_student_milestone_name = "-- Select Milestone --"
-    if 'direct_selected_add_student_milestone_id' not in st.session_state:
-        st.session_state.direct_selected_add_student_milestone_id = None
-
+    'direct_add_student_name_input_val': "",
+    'direct_add_student_email_input_val': "",
+    'direct_selected_add_student_gurukul_name': "",
+    'direct_selected_add_student_gurukul_id': None,
+    'direct_selected_add_student_milestone_name': "-- Select Milestone --",
+    'direct_selected_add_student_milestone_id': None,
     # Update form states (these will be set when a student is selected)
     # These are for the text inputs, not the selectboxes, as selectbox values
     # will be handled by local variables and then processed on button click.
-    if 'direct_update_student_name_input_val' not in st.session_state:
-        st.session_state.direct_update_student_name_input_val = ""
-    if 'direct_update_student_email_input_val' not in st.session_state:
-        st.session_state.direct_update_student_email_input_val = ""
-    
+    'direct_update_student_name_input_val': "",
+    'direct_update_student_email_input_val': "",
     # Flag to control initial loading of update form input values
-    if 'update_form_loaded_student_id' not in st.session_state:
-        st.session_state.update_form_loaded_student_id = None
+    'update_form_loaded_student_id': None,
+}
+
+
+def initialize_direct_student_crud_states():
+    for key, default in DIRECT_STUDENT_CRUD_STATE_DEFAULTS.items():
+        st.session_state.setdefault(key, default)
 
 
 def on_direct_add_gurukul_change():
-    all_gurukuls = fetch_all_gurukuls()
-    gurukul_options = {g['gname']: g['gid'] for g in all_gurukuls}
-    st.session_state.direct_selected_add_student_gurukul_id = gurukul_options.get(st.session_state.direct_selected_add_student_gurukul_name)
-    
+    # The gurukul ID itself is resolved from get_gurukul_name_to_id() right after the selectbox renders
     st.session_state.direct_selected_add_student_milestone_name = "-- Select Milestone --"
     st.session_state.direct_selected_add_student_milestone_id = None
-    st.cache_data.clear()
 
 
 def on_direct_add_milestone_change():
     current_gurukul_id = st.session_state.get('direct_selected_add_student_gurukul_id')
-    milestones_for_selected_gurukul = []
-    if current_gurukul_id is not None:
-        milestones_for_selected_gurukul = fetch_milestones_by_gurukul(current_gurukul_id)
 
     milestone_options_filtered = {"-- Select Milestone --": None}
-    milestone_options_filtered.update({
-        f"Level {m['level']} (Class: {m['class']}, ID: {m['mid']})": m['mid']
-        for m in milestones_for_selected_gurukul
-    })
+    if current_gurukul_id is not None:
+        milestone_options_filtered.update(get_milestone_options_by_gurukul(current_gurukul_id))
     st.session_state.direct_selected_add_student_milestone_id = milestone_options_filtered.get(st.session_state.direct_selected_add_student_milestone_name)
 
 
@@ -164,27 +213,22 @@ def show_student_crud_direct():
 
     initialize_direct_student_crud_states()
 
+    # Fetch everything the page needs in one concurrent batch
+    # (gurukuls and offerings warm the cache for the derived gurukul/milestone helpers)
+    _, _, all_milestones, students = fetch_in_parallel(
+        fetch_all_gurukuls, fetch_all_offerings, fetch_all_milestones, fetch_all_students_direct
+    )
+
     st.subheader("Add New Student")
-    all_gurukuls = fetch_all_gurukuls()
-    all_offerings = fetch_all_offerings() # Fetch all offerings
-    all_milestones = fetch_all_milestones() # Fetch all milestones
 
     # Create maps for easy lookup for the filtering logic
-    offering_id_to_details_map = {o['oid']: o for o in all_offerings}
-
-    # Determine which Gurukuls have at least one associated Milestone
-    gids_with_milestones = set()
-    for milestone in all_milestones:
-        offering_details = offering_id_to_details_map.get(milestone['oid'])
-        if offering_details and offering_details.get('gid'):
-            gids_with_milestones.add(offering_details['gid'])
-    
-    # Filter gurukuls to only include those that have associated milestones
-    filtered_gurukuls_with_milestones = [
-        g for g in all_gurukuls if g['gid'] in gids_with_milestones
-    ]
+    # assigned_milestones from /students only carry MIDs, so the display table looks up labels here
+    milestone_id_to_display_label = {m['mid']: m['short_label'] for m in all_milestones}
 
-    if not filtered_gurukuls_with_milestones: # Use the filtered list here
+    # Only gurukuls with at least one associated milestone can be assigned
+    gurukul_options = get_gurukul_name_to_id()
+
+    if not gurukul_options:
         st.warning("No Gurukuls with associated Milestones found. Please add Gurukuls and Milestones first to assign to students.")
         with st.form("add_student_direct_form_disabled", clear_on_submit=True):
             st.text_input("Student Name", key="direct_add_student_username_input_disabled", disabled=True)
@@ -194,15 +238,14 @@ def show_student_crud_direct():
             st.form_submit_button("Add Student", disabled=True)
         return
 
-    gurukul_options = {g['gname']: g['gid'] for g in filtered_gurukuls_with_milestones} # Use filtered list
-    gurukul_names = [g['gname'] for g in filtered_gurukuls_with_milestones] # Use filtered list
+    gurukul_id_to_name_map = {gid: gname for gname, gid in gurukul_options.items()}
+    gurukul_names = list(gurukul_options.keys())
+    gurukul_name_to_index = {gname: i for i, gname in enumerate(gurukul_names)}
 
     new_student_name_input = st.text_input("Student Name", key="direct_add_student_name_input_add_form")
     new_student_email_input = st.text_input("Student Email", key="direct_add_student_email_input_add_form")
 
-    current_gurukul_index = 0
-    if st.session_state.direct_selected_add_student_gurukul_name in gurukul_names:
-        current_gurukul_index = gurukul_names.index(st.session_state.direct_selected_add_student_gurukul_name)
+    current_gurukul_index = gurukul_name_to_index.get(st.session_state.direct_selected_add_student_gurukul_name, 0)
 
     selected_gurukul_name_add_form_current = st.selectbox(
         "Assign to Gurukul (Mandatory)",
@@ -215,21 +258,18 @@ def show_student_crud_direct():
 
 
     gurukul_id_for_milestone_filter = st.session_state.get('direct_selected_add_student_gurukul_id')
-    milestones_for_selected_gurukul = []
+    milestone_options_for_selected_gurukul = {}
     if gurukul_id_for_milestone_filter is not None:
-        milestones_for_selected_gurukul = fetch_milestones_by_gurukul(gurukul_id_for_milestone_filter)
+        milestone_options_for_selected_gurukul = get_milestone_options_by_gurukul(gurukul_id_for_milestone_filter)
     
     milestone_options_filtered = {"-- Select Milestone --": None}
-    milestone_options_filtered.update({
-        f"Level {m['level']} (Class: {m['class']}, ID: {m['mid']})": m['mid']
-        for m in milestones_for_selected_gurukul
-    })
+    if milestone_options_for_selected_gurukul:
+        milestone_options_filtered.update(milestone_options_for_selected_gurukul)
     milestone_names_filtered = list(milestone_options_filtered.keys())
 
-    current_milestone_index = 0
-    if st.session_state.direct_selected_add_student_milestone_name in milestone_names_filtered:
-        current_milestone_index = milestone_names_filtered.index(st.session_state.direct_selected_add_student_milestone_name)
-    else:
+    milestone_name_to_index = {name: i for i, name in enumerate(milestone_names_filtered)}
+    current_milestone_index = milestone_name_to_index.get(st.session_state.direct_selected_add_student_milestone_name)
+    if current_milestone_index is None:
         st.session_state.direct_selected_add_student_milestone_name = "-- Select Milestone --"
         current_milestone_index = 0
 
@@ -238,7 +278,7 @@ def show_student_crud_direct():
         milestone_names_filtered,
         key="direct_selected_add_student_milestone_name",
         index=current_milestone_index,
-        disabled=(gurukul_id_for_milestone_filter is None or not milestones_for_selected_gurukul),
+        disabled=(gurukul_id_for_milestone_filter is None or not milestone_options_for_selected_gurukul),
         on_change=on_direct_add_milestone_change
     )
     st.session_state.direct_selected_add_student_milestone_id = milestone_options_filtered.get(selected_milestone_name_add_form_current)
@@ -259,62 +299,48 @@ def show_student_crud_direct():
                     'gurukulId': st.session_state.direct_selected_add_student_gurukul_id,
                     'milestoneId': st.session_state.direct_selected_add_student_milestone_id
                 }
-                print(f"DEBUG: Sending add student payload: {payload}")
+                if DEBUG:
+                    print(f"DEBUG: Sending add student payload: {payload}")
                 status, data = direct_api_call('POST', '/students', payload)
                 if status == 201:
                     st.success(f"Student '{new_student_name_input}' added successfully!")
-                    st.cache_data.clear()
+                    clear_students_cache()
                     st.rerun()
                 elif status == 409:
                     st.warning(f"Failed to add student: User with email '{new_student_email_input}' already exists.")
                 else:
                     st.error(f"Failed to add student: {data.get('message', 'Unknown error')}")
     st.subheader("Existing Students")
-    students = fetch_all_students_direct()
     # ### DEBUG: Added debug print for raw fetched students data (UI and console)
     #st.markdown(f"**DEBUG (Raw Student Data from /students endpoint):** {json.dumps(students, indent=2)}")
-    print(f"DEBUG: Fetched existing students (raw data): {json.dumps(students, indent=2)}")
+    if DEBUG:
+        print(f"DEBUG: Fetched existing students (raw data): {json.dumps(students, indent=2)}")
     if not students:
         st.info("No Students found. Add one above!")
     else:
-        # ### CHANGE START: Fetch all milestones once for lookup in display table
-        # This is crucial because assigned_milestones from /students endpoint likely only contain MIDs, not full details.
-        all_milestones_fetched_for_display = fetch_all_milestones()
-        milestone_id_to_obj_map_for_display = {m['mid']: m for m in all_milestones_fetched_for_display}
-        # ### CHANGE END: Fetch all milestones once for lookup in display table
-        students_display_data = []
-        for student in students:
-            assigned_gurukuls_formatted = ", ".join([g['gname'] for g in student.get('assigned_gurukuls', [])])
-            if not assigned_gurukuls_formatted:
-                assigned_gurukuls_formatted = "N/A"
-            # ### CHANGE START: Corrected logic to format assigned milestones using lookup
-            assigned_milestones_formatted_list = []
-            # Iterate over the assigned_milestones references (which contain 'mid')
-            for assigned_m_ref in student.get('assigned_milestones', []):
-                milestone_id = assigned_m_ref.get('mid') # Get the milestone ID from the reference object
-                if milestone_id:
-                    # Lookup full details using the map created from all milestones
-                    full_milestone_details = milestone_id_to_obj_map_for_display.get(milestone_id)
-                    if full_milestone_details:
-                        # Ensure 'level' and 'class' keys exist in the full details
-                        level = full_milestone_details.get('level', 'N/A')
-                        class_val = full_milestone_details.get('class', 'N/A')
-                        assigned_milestones_formatted_list.append(
-                            f"Level {level} (Class {class_val})"
-                        )
-            assigned_milestones_formatted = ", ".join(assigned_milestones_formatted_list)
-            if not assigned_milestones_formatted:
-                assigned_milestones_formatted = "N/A"
-            # ### CHANGE END: Corrected logic to format assigned milestones using lookup
-            students_display_data.append({
-                'SID': student['sid'],
-                'Name': student['sname'],
-                'Email': student['email'],
-                'Assigned Gurukuls': assigned_gurukuls_formatted,
-                'Assigned Milestones': assigned_milestones_formatted
-            })
-        st.dataframe(students_display_data, use_container_width=True)
+        # Build the table column by column rather than as one dict per row
+        df_students = pd.DataFrame({
+            'SID': [student['sid'] for student in students],
+            'Name': [student['sname'] for student in students],
+            'Email': [student['email'] for student in students],
+            'Assigned Gurukuls': [
+                ", ".join(g['gname'] for g in student.get('assigned_gurukuls', []))
+                for student in students
+            ],
+            'Assigned Milestones': [
+                ", ".join(
+                    milestone_id_to_display_label[m_ref['mid']]
+                    for m_ref in student.get('assigned_milestones', [])
+                    if m_ref.get('mid') in milestone_id_to_display_label
+                )
+                for student in students
+            ],
+        })
+        assigned_columns = ['Assigned Gurukuls', 'Assigned Milestones']
+        df_students[assigned_columns] = df_students[assigned_columns].replace('', 'N/A')
+        st.dataframe(df_students, use_container_width=True)
         student_options = {f"{u['sname']} (ID: {u['sid']})": u['sid'] for u in students}
+        student_id_to_obj_map = {u['sid']: u for u in students}
         selected_student_display = st.selectbox(
             "Select Student to Update/Delete",
             options=["-- Select Student --"] + list(student_options.keys()),
@@ -328,7 +354,7 @@ def show_student_crud_direct():
             st.markdown("---")
             st.subheader(f"Update/Delete Student (ID: {st.session_state.selected_student_id})")
             
-            selected_student_obj = next((s for s in students if s['sid'] == st.session_state.selected_student_id), None)
+            selected_student_obj = student_id_to_obj_map.get(st.session_state.selected_student_id)
 
             if selected_student_obj:
                 # Initialize update form text inputs only once when a new student is selected
@@ -347,16 +373,12 @@ def show_student_crud_direct():
                 # Determine the currently assigned gurukul name for the selectbox default
                 current_gurukul_name = "None (Unassign Gurukul)"
                 if current_assigned_gurukul_id:
-                    current_gurukul_obj = next((g for g in filtered_gurukuls_with_milestones if g['gid'] == current_assigned_gurukul_id), None) # Use filtered list
-                    if current_gurukul_obj:
-                        current_gurukul_name = current_gurukul_obj['gname']
+                    current_gurukul_name = gurukul_id_to_name_map.get(current_assigned_gurukul_id, current_gurukul_name)
 
                 # Create options for Gurukul dropdown, including "None"
-                gurukul_options_for_update_select = ["None (Unassign Gurukul)"] + [g['gname'] for g in filtered_gurukuls_with_milestones] # Use filtered list
-                try:
-                    default_gurukul_index = gurukul_options_for_update_select.index(current_gurukul_name)
-                except ValueError:
-                    default_gurukul_index = 0 # Default to "None" if current gurukul not in options
+                gurukul_options_for_update_select = ["None (Unassign Gurukul)"] + gurukul_names
+                # Shifted by one for the leading "None" option, which is also the fallback
+                default_gurukul_index = gurukul_name_to_index.get(current_gurukul_name, -1) + 1
 
                 selected_gurukul_name_update_form = st.selectbox(
                     "Assign/Reassign Gurukul",
@@ -368,50 +390,34 @@ def show_student_crud_direct():
                 # Convert selected gurukul name back to ID
                 final_gurukul_id_to_send = None
                 if selected_gurukul_name_update_form != "None (Unassign Gurukul)":
-                    final_gurukul_id_to_send = next(
-                        (g['gid'] for g in filtered_gurukuls_with_milestones if g['gname'] == selected_gurukul_name_update_form), None # Use filtered list
-                    )
+                    final_gurukul_id_to_send = gurukul_options.get(selected_gurukul_name_update_form)
 
                 # --- Milestone selection for Update ---
-                milestones_for_update_gurukul = []
+                milestone_name_to_id_update = {}
                 if final_gurukul_id_to_send:
-                    milestones_for_update_gurukul = fetch_milestones_by_gurukul(final_gurukul_id_to_send)
-
-                current_milestone_name = "None (Unassign Milestone)"
-                if current_assigned_milestone_id:
-                    current_milestone_obj = next(
-                        (m for m in milestones_for_update_gurukul if m['mid'] == current_assigned_milestone_id), None
-                    )
-                    if current_milestone_obj:
-                        current_milestone_name = f"Level {current_milestone_obj['level']} (Class: {current_milestone_obj['class']}, ID: {current_milestone_obj['mid']})"
-
-                milestone_options_for_update_select = ["None (Unassign Milestone)"] + [
-                    f"Level {m['level']} (Class: {m['class']}, ID: {m['mid']})"
-                    for m in milestones_for_update_gurukul
-                ]
-                
-                try:
-                    default_milestone_index = milestone_options_for_update_select.index(current_milestone_name)
-                except ValueError:
-                    default_milestone_index = 0 # Default to "None" if current milestone not in options
+                    milestone_name_to_id_update = get_milestone_options_by_gurukul(final_gurukul_id_to_send)
+                milestone_options_for_update_select = ["None (Unassign Milestone)"]
+                default_milestone_index = 0 # Default to "None" if current milestone not in options
+                if milestone_name_to_id_update:
+                    milestone_options_for_update_select.extend(milestone_name_to_id_update.keys())
+                    # Positions start at 1 after the "None" option
+                    milestone_id_to_index_update = {mid: i for i, mid in enumerate(milestone_name_to_id_update.values(), start=1)}
+                    default_milestone_index = milestone_id_to_index_update.get(current_assigned_milestone_id, 0)
 
                 selected_milestone_name_update_form = st.selectbox(
                     "Assign/Reassign Milestone",
                     options=milestone_options_for_update_select,
                     index=default_milestone_index,
                     key=f"update_milestone_select_{st.session_state.selected_student_id}",
-                    disabled=(final_gurukul_id_to_send is None or not milestones_for_update_gurukul)
+                    disabled=(final_gurukul_id_to_send is None or not milestone_name_to_id_update)
                 )
 
-                final_milestone_id_to_send = None
-                if selected_milestone_name_update_form != "None (Unassign Milestone)":
-                    match = re.search(r"ID: (\d+)", selected_milestone_name_update_form)
-                    if match:
-                        final_milestone_id_to_send = int(match.group(1))
+                final_milestone_id_to_send = milestone_name_to_id_update.get(selected_milestone_name_update_form)
 
                 # --- Debugging (Optional, can be removed in final version) ---
-                print(f"CONSOLE DEBUG (Update Button Click): Final Gurukul ID to send: {final_gurukul_id_to_send}")
-                print(f"CONSOLE DEBUG (Update Button Click): Final Milestone ID to send: {final_milestone_id_to_send}")
+                if DEBUG:
+                    print(f"CONSOLE DEBUG (Update Button Click): Final Gurukul ID to send: {final_gurukul_id_to_send}")
+                    print(f"CONSOLE DEBUG (Update Button Click): Final Milestone ID to send: {final_milestone_id_to_send}")
 
                 col1, col2 = st.columns(2)
                 with col1:
@@ -425,11 +431,12 @@ def show_student_crud_direct():
                                 'gurukulId': final_gurukul_id_to_send,
                                 'milestoneId': final_milestone_id_to_send
                             }
-                            print(f"DEBUG: Sending update student payload for SID {st.session_state.selected_student_id}: {update_payload}")
+                            if DEBUG:
+                                print(f"DEBUG: Sending update student payload for SID {st.session_state.selected_student_id}: {update_payload}")
                             status, data = direct_api_call('PUT', f'/students/{st.session_state.selected_student_id}', update_payload)
                             if status == 200:
                                 st.success(f"Student '{updated_name}' updated successfully!")
-                                st.cache_data.clear()
+                                clear_students_cache()
                                 st.session_state.update_form_loaded_student_id = None # Reset flag to re-initialize on next selection
                                 st.rerun()
                             elif status == 409:
@@ -442,7 +449,7 @@ def show_student_crud_direct():
                             status, data = direct_api_call('DELETE', f'/students/{st.session_state.selected_student_id}')
                             if status == 204:
                                 st.success(f"Student (ID: {st.session_state.selected_student_id}) deleted successfully!")
-                                st.cache_data.clear()
+                                clear_students_cache()
                                 st.session_state.selected_student_id = None # Clear selection after deletion
                                 st.rerun()
                             else:
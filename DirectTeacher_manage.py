@@ -2,35 +2,33 @@
 
 import streamlit as st
 import requests
-import json
-import re # Import regex for parsing IDs from display strings
+import pandas as pd
+import orjson
 
 #API_BASE_URL = "http://localhost:5002"
 from config import API_BASE_URL
+from api_session import get_http_session, API_TIMEOUT, fetch_in_parallel, caches_endpoint, clear_endpoint_caches
 
 
 def direct_api_call(method, endpoint, payload=None):
     url = f"{API_BASE_URL}{endpoint}"
-    headers = {"Content-Type": "application/json"}
-    
+
     try:
-        if method == 'GET':
-            response = requests.get(url, headers=headers)
-        elif method == 'POST':
-            response = requests.post(url, headers=headers, data=json.dumps(payload))
-        elif method == 'PUT':
-            response = requests.put(url, headers=headers, data=json.dumps(payload))
-        elif method == 'DELETE':
-            response = requests.delete(url, headers=headers)
-        else:
+        if method not in ('GET', 'POST', 'PUT', 'DELETE'):
             return 400, {"message": "Unsupported HTTP method"}
+        response = get_http_session().request(
+            method,
+            url,
+            data=orjson.dumps(payload) if method in ('POST', 'PUT') else None,
+            timeout=API_TIMEOUT
+        )
 
         if response.status_code == 204:
             return response.status_code, {}
 
         try:
-            data = response.json()
-        except json.JSONDecodeError:
+            data = orjson.loads(response.content)
+        except orjson.JSONDecodeError:
             print(f"DEBUG: JSONDecodeError for {method} {url}. Raw response content: '{response.text}'")
             return response.status_code, {"message": f"Invalid JSON response from API: {response.text}"}
 
@@ -47,7 +45,8 @@ def direct_api_call(method, endpoint, payload=None):
         return 500, {"message": f"API request error: {e}"}
 
 
-@st.cache_data(ttl=60)
+@caches_endpoint('/teachers')
+@st.cache_data(ttl=60, show_spinner=False)
 def fetch_all_teachers_direct():
     status, data = direct_api_call('GET', '/teachers')
     if status == 200:
@@ -55,7 +54,20 @@ def fetch_all_teachers_direct():
     st.error(f"Failed to fetch teachers directly: {data.get('message', 'Unknown error')}")
     return []
 
-@st.cache_data(ttl=60)
+@caches_endpoint('/teachers')
+@st.cache_data(ttl=60, show_spinner=False)
+def get_teacher_options():
+    """Maps each teacher's selectbox label to its teachid."""
+    return {f"{t['name']} (ID: {t['teachid']})": t['teachid'] for t in fetch_all_teachers_direct()}
+
+def clear_teachers_cache():
+    """Clears every page's cached teachers after a teacher add or update."""
+    clear_endpoint_caches('/teachers')
+    # The selected teacher's assigned subjects may have changed; rebuild them on the next render
+    st.session_state.pop('last_selected_teacher_id', None)
+
+@caches_endpoint('/subjects')
+@st.cache_data(ttl=60, show_spinner=False)
 def fetch_all_subjects():
     """Fetches all subjects, including their level, for use in dropdowns."""
     status, data = direct_api_call('GET', '/subjects')
@@ -67,6 +79,22 @@ def fetch_all_subjects():
     st.error(f"Failed to fetch subjects: {data.get('message', 'Unknown error')}")
     return []
 
+@caches_endpoint('/subjects')
+@st.cache_data(ttl=60, show_spinner=False)
+def get_subject_maps():
+    """Builds the subject lookup maps and multiselect options."""
+    all_subjects = fetch_all_subjects()
+    # Build each "Name (Level: X, ID: Y)" display string once,
+    # then map display string back to the full subject object for easy lookup
+    subid_to_display = {
+        s['subid']: f"{s['subname']} (Level: {s['level']}, ID: {s['subid']})"
+        for s in all_subjects
+    }
+    subject_display_to_obj_map = {subid_to_display[s['subid']]: s for s in all_subjects}
+    # Options for multiselect, sorted by subject name
+    subject_display_options = sorted(subject_display_to_obj_map.keys())
+    return subid_to_display, subject_display_to_obj_map, subject_display_options
+
 # --- Session State Initialization for Direct Teacher Management ---
 def initialize_direct_teacher_crud_states():
     # Only initialize if not already set, to preserve values across reruns
@@ -92,19 +120,11 @@ def show_teacher_crud_direct():
 
     initialize_direct_teacher_crud_states()
 
-    st.subheader("Add New Teacher")
-    all_subjects = fetch_all_subjects()
-    
-    # Create a map from display string to full subject object for easy lookup
-    # and a map from subid to full subject object
-    subject_display_to_obj_map = {
-        f"{s['subname']} (Level: {s['level']}, ID: {s['subid']})": s 
-        for s in all_subjects
-    }
-    subject_id_to_obj_map = {s['subid']: s for s in all_subjects}
+    # Both lists are independent, so fetch them concurrently on a cache miss
+    subject_maps, teachers = fetch_in_parallel(get_subject_maps, fetch_all_teachers_direct)
+    subid_to_display, subject_display_to_obj_map, subject_display_options = subject_maps
 
-    # Options for multiselect, sorted by subject name
-    subject_display_options = sorted(list(subject_display_to_obj_map.keys()))
+    st.subheader("Add New Teacher")
 
     with st.form("add_teacher_direct_form", clear_on_submit=True):
         new_teacher_name = st.text_input("Teacher Name", key="add_teacher_name_input_add_form")
@@ -136,7 +156,7 @@ def show_teacher_crud_direct():
                 status, data = direct_api_call('POST', '/teachers', payload)
                 if status == 201:
                     st.success(f"Teacher '{new_teacher_name}' added successfully!")
-                    st.cache_data.clear()
+                    clear_teachers_cache()
                     st.rerun()
                 elif status == 409:
                     st.warning(f"Failed to add teacher: Teacher with email '{new_teacher_email}' already exists.")
@@ -144,60 +164,50 @@ def show_teacher_crud_direct():
                     st.error(f"Failed to add teacher: {data.get('message', 'Unknown error')}")
 
     st.subheader("Existing Teachers")
-    teachers = fetch_all_teachers_direct()
     if not teachers:
         st.info("No Teachers found. Add one above!")
     else:
-        teachers_display_data = []
-        for teacher in teachers:
-            assigned_subjects_formatted_list = []
-            for assigned_subject in teacher.get('assigned_subjects', []):
-                # Use the subject_id_to_obj_map to get full details including level and ID
-                full_subject_obj = subject_id_to_obj_map.get(assigned_subject['subid'])
-                if full_subject_obj:
-                    # Corrected to include ID
-                    assigned_subjects_formatted_list.append(
-                        f"{full_subject_obj['subname']} (Level: {full_subject_obj['level']}, ID: {full_subject_obj['subid']})"
-                    )
-                else:
-                    # Fallback if full details not found (shouldn't happen if API is consistent)
-                    assigned_subjects_formatted_list.append(assigned_subject['subname']) 
-            
-            assigned_subjects_formatted = ", ".join(assigned_subjects_formatted_list)
-            if not assigned_subjects_formatted:
-                assigned_subjects_formatted = "N/A"
-
-            teachers_display_data.append({
-                'TeachID': teacher['teachid'],
-                'Name': teacher['name'],
-                'Email': teacher['email'],
-                'Assigned Subjects': assigned_subjects_formatted,
-                'Created At': teacher['created_at'].split('T')[0] if 'created_at' in teacher and teacher['created_at'] else 'N/A',
-                'Last Login': teacher['last_login'].split('T')[0] if 'last_login' in teacher and teacher['last_login'] else 'N/A'
-            })
-        st.dataframe(teachers_display_data, use_container_width=True)
-
-        teacher_options = {f"{t['name']} (ID: {t['teachid']})": t['teachid'] for t in teachers}
+        # Build the table column by column rather than as one dict per row
+        df_teachers = pd.DataFrame({
+            'TeachID': [teacher['teachid'] for teacher in teachers],
+            'Name': [teacher['name'] for teacher in teachers],
+            'Email': [teacher['email'] for teacher in teachers],
+            # Fall back to the bare subject name if full details are not found (shouldn't happen if API is consistent)
+            'Assigned Subjects': [
+                ", ".join(
+                    subid_to_display.get(assigned_subject['subid'], assigned_subject['subname'])
+                    for assigned_subject in teacher.get('assigned_subjects', [])
+                ) or "N/A"
+                for teacher in teachers
+            ],
+            # ISO-8601 timestamps start with the YYYY-MM-DD date, so keep the first 10 characters
+            'Created At': [(teacher.get('created_at') or 'N/A')[:10] for teacher in teachers],
+            'Last Login': [(teacher.get('last_login') or 'N/A')[:10] for teacher in teachers]
+        })
+        st.dataframe(df_teachers, use_container_width=True)
+
+        teacher_options = get_teacher_options()
+        teacher_by_id = {t['teachid']: t for t in teachers}
         selected_teacher_display = st.selectbox("Select Teacher for Update", ["-- Select --"] + list(teacher_options.keys()), key="select_teacher_direct_crud")
 
         if selected_teacher_display and selected_teacher_display != "-- Select --":
             st.session_state.selected_teacher_id = teacher_options[selected_teacher_display]
-            current_teacher_data = next((t for t in teachers if t['teachid'] == st.session_state.selected_teacher_id), None)
+            current_teacher_data = teacher_by_id.get(st.session_state.selected_teacher_id)
 
             if current_teacher_data:
                 # Set session state values for the update form based on selected teacher
                 st.session_state.update_teacher_name_input_val = current_teacher_data['name']
                 st.session_state.update_teacher_email_input_val = current_teacher_data['email']
                 
-                # Convert current assigned subject IDs to their full display strings (Name (Level: X, ID: Y))
-                current_assigned_subject_display_names = []
-                for assigned_sub in current_teacher_data.get('assigned_subjects', []):
-                    full_sub_obj = subject_id_to_obj_map.get(assigned_sub['subid'])
-                    if full_sub_obj:
-                        current_assigned_subject_display_names.append(
-                            f"{full_sub_obj['subname']} (Level: {full_sub_obj['level']}, ID: {full_sub_obj['subid']})"
-                        )
-                st.session_state.update_teacher_subjects_multiselect_val = current_assigned_subject_display_names
+                # Convert current assigned subject IDs to their full display strings (Name (Level: X, ID: Y)),
+                # only when the selection changed; plain reruns (e.g. typing in the form) reuse the last list
+                if st.session_state.get('last_selected_teacher_id') != st.session_state.selected_teacher_id:
+                    st.session_state.update_teacher_subjects_multiselect_val = [
+                        subid_to_display[assigned_sub['subid']]
+                        for assigned_sub in current_teacher_data.get('assigned_subjects', [])
+                        if assigned_sub['subid'] in subid_to_display
+                    ]
+                    st.session_state.last_selected_teacher_id = st.session_state.selected_teacher_id
 
                 st.markdown("---")
                 st.subheader(f"Update Teacher: {selected_teacher_display}")
@@ -208,7 +218,11 @@ def show_teacher_crud_direct():
                     updated_selected_subject_display_names = st.multiselect(
                         "Update Assigned Subjects (Optional)",
                         subject_display_options, # Use the enhanced display options
-                        default=st.session_state.update_teacher_subjects_multiselect_val,
+                        # The saved list can predate a subject cache refresh, so keep only labels that still exist
+                        default=[
+                            display_name for display_name in st.session_state.update_teacher_subjects_multiselect_val
+                            if display_name in subject_display_to_obj_map
+                        ],
                         key=f"update_teacher_subjects_multiselect_{st.session_state.selected_teacher_id}"
                     )
                     # Convert selected display names back to subject IDs
@@ -230,9 +244,12 @@ def show_teacher_crud_direct():
                             status, data = direct_api_call('PUT', f'/teachers/{st.session_state.selected_teacher_id}', update_payload)
                             if status == 200:
                                 st.success(f"Teacher '{updated_name}' updated successfully!")
-                                st.cache_data.clear()
+                                clear_teachers_cache()
                                 st.rerun()
                             elif status == 409:
                                 st.warning(f"Failed to update teacher: Teacher with email '{updated_email}' already exists.")
                             else:
                                 st.error(f"Failed to update teacher: {data.get('message', 'Unknown error')}")
+        else:
+            # Leaving the teacher forgets the saved subject list, so picking one again rebuilds it
+            st.session_state.pop('last_selected_teacher_id', None)
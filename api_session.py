@@ -0,0 +1,69 @@
+# api_session.py
+import threading
+from collections import defaultdict
+import streamlit as st
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+# (connect, read) timeouts in seconds for every API call
+API_TIMEOUT = (3, 10)
+
+
+# Cached as a resource so one session (and its connection pool) is shared by every
+# rerun and user session of this process instead of being rebuilt.
+@st.cache_resource
+def get_http_session():
+    """Returns the process-wide requests.Session with a keep-alive pool and a light retry on transient errors."""
+    session = requests.Session()
+    session.headers.update({"Content-Type": "application/json"})
+    # Retry connection errors and gateway 5xx with exponential backoff (0.2s, 0.4s, 0.8s).
+    # POST is left out: a retried create could insert the same row twice.
+    retry = Retry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=["GET", "PUT", "DELETE"],
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Cached fetchers by the API endpoint their data comes from. Several pages cache the same
+# endpoint, so a mutation clears it everywhere through clear_endpoint_caches().
+CACHED_FETCHERS_BY_ENDPOINT = defaultdict(dict)
+
+
+def caches_endpoint(*endpoints):
+    """Decorator (applied above @st.cache_data) registering a cached function as holding data from endpoints."""
+    def register(fetcher):
+        for endpoint in endpoints:
+            # Keyed by name so a module re-executed by Streamlit replaces its entry instead of adding one
+            CACHED_FETCHERS_BY_ENDPOINT[endpoint][f"{fetcher.__module__}.{fetcher.__qualname__}"] = fetcher
+        return fetcher
+    return register
+
+
+def clear_endpoint_caches(*endpoints):
+    """Clears every page's cached fetchers for endpoints after a mutation that changed them."""
+    for endpoint in endpoints:
+        for fetcher in CACHED_FETCHERS_BY_ENDPOINT[endpoint].values():
+            fetcher.clear()
+
+
+def fetch_in_parallel(*fetchers):
+    """Runs independent fetch functions concurrently and returns their results in order."""
+    ctx = get_script_run_ctx()
+
+    def run(fetcher):
+        # Attach the script context so st.error/st.cache_data work inside worker threads
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fetcher()
+
+    with ThreadPoolExecutor(max_workers=len(fetchers)) as executor:
+        return list(executor.map(run, fetchers))
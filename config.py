@@ -2,3 +2,6 @@
 import os
 
 API_BASE_URL = os.getenv("API_BASE_URL", "https://dev-wz-opmate-consupport-ms-991234358999.asia-south1.run.app")
+
+# Set OPMATE_DEBUG=1 to print verbose API/debug traces to the console
+DEBUG = os.getenv("OPMATE_DEBUG") == "1"
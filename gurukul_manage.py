@@ -1,34 +1,48 @@
 # gurukul_manage.py
 import streamlit as st
 import requests
-import pandas as pd
+import orjson
 
 # Define the base URL for your Node.js API
 #API_BASE_URL = "http://localhost:5002"
 from config import API_BASE_URL
+from api_session import get_http_session, API_TIMEOUT, caches_endpoint, clear_endpoint_caches
 st.write("Current API URL:", API_BASE_URL)
 
 # --- API Interaction Functions ---
 
 # Function to fetch all gurukuls from the API
+@caches_endpoint('/gurukul')
+@st.cache_data(ttl=30)
 def get_all_gurukuls():
     """Fetches all gurukuls from the backend API."""
     try:
-        response = requests.get(f"{API_BASE_URL}/gurukul")
+        response = get_http_session().get(f"{API_BASE_URL}/gurukul", timeout=API_TIMEOUT)
         response.raise_for_status()  # Raise an HTTPError for bad responses (4xx or 5xx)
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        return orjson.loads(response.content)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         st.error(f"Error fetching gurukuls: {e}")
         return []
 
+@caches_endpoint('/gurukul')
+@st.cache_data(ttl=30)
+def get_gurukul_options():
+    """Maps each gurukul's selectbox label to its gid."""
+    return {f"{g['gname']} (ID: {g['gid']})": g['gid'] for g in get_all_gurukuls()}
+
+def clear_gurukuls_cache():
+    """Clears every page's cached gurukuls after a gurukul mutation. Renames show up in student
+    assignments, and deleting a gurukul also deletes its offerings and their milestones."""
+    clear_endpoint_caches('/gurukul', '/gurukul-offerings', '/milestones', '/students')
+
 # Function to create a new gurukul via the API
 def create_gurukul(gname):
     """Creates a new gurukul with the given name."""
     try:
-        response = requests.post(f"{API_BASE_URL}/gurukul", json={"gname": gname})
+        response = get_http_session().post(f"{API_BASE_URL}/gurukul", data=orjson.dumps({"gname": gname}), timeout=API_TIMEOUT)
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        return orjson.loads(response.content)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         st.error(f"Error creating gurukul: {e}")
         return None
 
@@ -36,10 +50,10 @@ def create_gurukul(gname):
 def update_gurukul(gid, gname):
     """Updates an existing gurukul with the given ID and new name."""
     try:
-        response = requests.put(f"{API_BASE_URL}/gurukul/{gid}", json={"gname": gname})
+        response = get_http_session().put(f"{API_BASE_URL}/gurukul/{gid}", data=orjson.dumps({"gname": gname}), timeout=API_TIMEOUT)
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        return orjson.loads(response.content)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         st.error(f"Error updating gurukul: {e}")
         return None
 
@@ -47,7 +61,7 @@ def update_gurukul(gid, gname):
 def delete_gurukul(gid):
     """Deletes a gurukul with the given ID."""
     try:
-        response = requests.delete(f"{API_BASE_URL}/gurukul/{gid}")
+        response = get_http_session().delete(f"{API_BASE_URL}/gurukul/{gid}", timeout=API_TIMEOUT)
         response.raise_for_status()
         return response.status_code == 200 # Check for successful deletion (status 200 OK)
     except requests.exceptions.RequestException as e:
@@ -78,6 +92,7 @@ def gurukul_manage_page():
                     result = create_gurukul(new_gurukul_name)
                     if result:
                         st.success(f"Gurukul '{result['gname']}' (ID: {result['gid']}) created successfully!")
+                        clear_gurukuls_cache()
                         st.rerun() # Rerun to refresh list
                     else:
                         st.error("Failed to create gurukul. Please check API logs.")
@@ -91,6 +106,7 @@ def gurukul_manage_page():
     gurukuls = get_all_gurukuls()
 
     if gurukuls:
+        import pandas as pd # Only needed for this table; keeps module import light
         # Convert list of dicts to DataFrame for better display
         df_gurukuls = pd.DataFrame(gurukuls)
         st.dataframe(df_gurukuls, use_container_width=True)
@@ -102,8 +118,9 @@ def gurukul_manage_page():
     # --- Update Gurukul Section ---
     st.subheader("Update Existing Gurukul")
     if gurukuls:
-        # Create a dictionary for easy lookup and display in selectbox
-        gurukul_options = {f"{g['gname']} (ID: {g['gid']})": g['gid'] for g in gurukuls}
+        # Create dictionaries for easy lookup and display in selectbox
+        gurukul_options = get_gurukul_options()
+        gurukul_by_id = {g['gid']: g for g in gurukuls}
         selected_gurukul_display = st.selectbox(
             "Select Gurukul to Update",
             options=list(gurukul_options.keys()),
@@ -115,7 +132,7 @@ def gurukul_manage_page():
         # Find the currently selected gurukul object to pre-fill its name
         current_gname = ""
         if selected_gurukul_id is not None:
-            current_gurukul_obj = next((g for g in gurukuls if g['gid'] == selected_gurukul_id), None)
+            current_gurukul_obj = gurukul_by_id.get(selected_gurukul_id)
             if current_gurukul_obj:
                 current_gname = current_gurukul_obj['gname']
 
@@ -133,6 +150,7 @@ def gurukul_manage_page():
                         result = update_gurukul(selected_gurukul_id, updated_gurukul_name)
                         if result:
                             st.success(f"Gurukul ID {result['gid']} updated to '{result['gname']}' successfully!")
+                            clear_gurukuls_cache()
                             st.rerun() # Rerun to refresh list
                         else:
                             st.error("Failed to update gurukul. Please check API logs.")
@@ -146,7 +164,7 @@ def gurukul_manage_page():
     # --- Delete Gurukul Section ---
     st.subheader("Delete Gurukul")
     if gurukuls:
-        gurukul_options_delete = {f"{g['gname']} (ID: {g['gid']})": g['gid'] for g in gurukuls}
+        gurukul_options_delete = get_gurukul_options()
         selected_gurukul_display_delete = st.selectbox(
             "Select Gurukul to Delete",
             options=list(gurukul_options_delete.keys()),
@@ -171,6 +189,7 @@ def gurukul_manage_page():
                     if success:
                         st.success(f"Gurukul ID {selected_gurukul_id_delete} and its offerings deleted successfully!")
                         del st.session_state.confirm_delete_gurukul_id # Clear confirmation state
+                        clear_gurukuls_cache()
                         st.rerun() # Rerun to refresh list
                     else:
                         st.error("Failed to delete gurukul. Please check API logs.")
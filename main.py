@@ -1,30 +1,22 @@
 # main.py
 import streamlit as st
 
-# Import all necessary management modules and their functions
-# Ensure these imports match your actual file names and function names
-from gurukul_manage import gurukul_manage_page
-from offerings_manage import offerings_manage_page
-from milestones_manage import milestones_manage_page
-from subjects_manage import subjects_manage_page
-from topics_manage import topics_manage_page
-from users_manage import users_manage_page
-from u_teachers_manage import u_teachers_manage_page
-from u_students_manage import u_students_manage_page
-from showTopicbySubject import show_topics_by_subject_page
-from showTopicsbyLevel import show_topics_by_level_page
-
-# Imports for the new direct management sections
-from DirectTeacher_manage import show_teacher_crud_direct
-from DirectStudent_manage import show_student_crud_direct
+# Management page modules are imported inside their view branches below, so a
+# cold start only loads the module for the view being rendered.
+# Ensure those imports match your actual file names and function names
 from config import API_BASE_URL
 st.write("Current API URL:", API_BASE_URL)
 
 # --- Helper Function for Navigation ---
 def set_view(view_name):
-    """Sets the current view in session state and clears cache."""
+    """Sets the current view in session state."""
+    # Cached data is not cleared here: every mutation clears the cached copies of the
+    # endpoints it changed on all pages (api_session.clear_endpoint_caches), and
+    # changes made outside this app are picked up when the TTLs expire. The direct student
+    # page keeps its list in session state instead, which no shared clear reaches, so it is
+    # dropped here to refetch the students whenever the user comes back to that page.
+    st.session_state.pop('direct_students_cache', None)
     st.session_state.current_view = view_name
-    st.cache_data.clear() # Clear cache when changing views to ensure fresh data
 
 # --- Main Application ---
 def main():
@@ -91,30 +83,42 @@ def main():
 
     # Existing Management Pages
     elif st.session_state.current_view == "gurukuls_page":
+        from gurukul_manage import gurukul_manage_page
         gurukul_manage_page()
     elif st.session_state.current_view == "offerings_page":
+        from offerings_manage import offerings_manage_page
         offerings_manage_page()
     elif st.session_state.current_view == "milestones_page":
+        from milestones_manage import milestones_manage_page
         milestones_manage_page()
     elif st.session_state.current_view == "subjects_page":
+        from subjects_manage import subjects_manage_page
         subjects_manage_page()
     elif st.session_state.current_view == "topics_page":
+        from topics_manage import topics_manage_page
         topics_manage_page()
     elif st.session_state.current_view == "users_page":
+        from users_manage import users_manage_page
         users_manage_page()
     elif st.session_state.current_view == "u_teachers_page":
+        from u_teachers_manage import u_teachers_manage_page
         u_teachers_manage_page()
     elif st.session_state.current_view == "u_students_page":
+        from u_students_manage import u_students_manage_page
         u_students_manage_page()
     elif st.session_state.current_view == "topics_by_subject_page":
+        from showTopicbySubject import show_topics_by_subject_page
         show_topics_by_subject_page()
     elif st.session_state.current_view == "topics_by_level_page":
+        from showTopicsbyLevel import show_topics_by_level_page
         show_topics_by_level_page()
     
     # Direct Management (Old Way) Pages - These will now correctly open
     elif st.session_state.current_view == 'direct_teacher_crud':
+        from DirectTeacher_manage import show_teacher_crud_direct
         show_teacher_crud_direct()
     elif st.session_state.current_view == 'direct_student_crud':
+        from DirectStudent_manage import show_student_crud_direct
         show_student_crud_direct()
 
 
@@ -1,41 +1,46 @@
 # milestones_manage.py
 import streamlit as st
 import requests
+import orjson
 import pandas as pd
+from collections import defaultdict
 
 # --- Configuration ---
 #API_BASE_URL = "http://localhost:5002" # Your Node.js API URL
-from config import API_BASE_URL
+from config import API_BASE_URL, DEBUG
+from api_session import get_http_session, API_TIMEOUT, fetch_in_parallel, caches_endpoint, clear_endpoint_caches
 
 # --- Level Mapping (MUST be consistent with API) ---
+# Levels are listed in their natural order, so filtered level lists keep that order without sorting
 LEVEL_MAPPING = {
-    "G1": ["L1", "L2", "L3", "L4"],
-    "G2": ["L5", "L6", "L7", "L8"],
-    "G3": ["L9", "L10", "L11", "L12"],
-    "G4": ["L13", "L14", "L15", "L16"],
+    "G1": ("L1", "L2", "L3", "L4"),
+    "G2": ("L5", "L6", "L7", "L8"),
+    "G3": ("L9", "L10", "L11", "L12"),
+    "G4": ("L13", "L14", "L15", "L16"),
 }
-ALL_POSSIBLE_LEVELS = sorted(list(set(level for levels in LEVEL_MAPPING.values() for level in levels)))
 
 
 # --- API Interaction Functions for Milestones ---
 
+@caches_endpoint('/milestones')
+@st.cache_data(ttl=60, show_spinner=False)
 def get_all_milestones():
     """Fetches all milestones from the backend API."""
     try:
-        response = requests.get(f"{API_BASE_URL}/milestones")
+        response = get_http_session().get(f"{API_BASE_URL}/milestones", timeout=API_TIMEOUT)
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        return orjson.loads(response.content)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         st.error(f"Error fetching milestones: {e}")
         return []
 
 def create_milestone(milestone_class, level, oid):
     """Creates a new milestone."""
     try:
-        response = requests.post(f"{API_BASE_URL}/milestones", json={"class": milestone_class, "level": level, "oid": oid})
+        response = get_http_session().post(f"{API_BASE_URL}/milestones", json={"class": milestone_class, "level": level, "oid": oid}, timeout=API_TIMEOUT)
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        return orjson.loads(response.content)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         st.error(f"Error creating milestone: {e}")
         return None
 
@@ -50,17 +55,17 @@ def update_milestone(mid, milestone_class=None, level=None, oid=None):
         payload["oid"] = oid
     
     try:
-        response = requests.put(f"{API_BASE_URL}/milestones/{mid}", json=payload)
+        response = get_http_session().put(f"{API_BASE_URL}/milestones/{mid}", json=payload, timeout=API_TIMEOUT)
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        return orjson.loads(response.content)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         st.error(f"Error updating milestone: {e}")
         return None
 
 def delete_milestone(mid):
     """Deletes a milestone."""
     try:
-        response = requests.delete(f"{API_BASE_URL}/milestones/{mid}")
+        response = get_http_session().delete(f"{API_BASE_URL}/milestones/{mid}", timeout=API_TIMEOUT)
         response.raise_for_status()
         return response.status_code == 200
     except requests.exceptions.RequestException as e:
@@ -69,26 +74,35 @@ def delete_milestone(mid):
 
 # --- API Interaction Functions for Gurukul Offerings (re-used) ---
 
+@caches_endpoint('/gurukul-offerings')
+@st.cache_data(ttl=60, show_spinner=False)
 def get_all_gurukul_offerings():
     """Fetches all gurukul offerings from the backend API."""
     try:
-        response = requests.get(f"{API_BASE_URL}/gurukul-offerings")
+        response = get_http_session().get(f"{API_BASE_URL}/gurukul-offerings", timeout=API_TIMEOUT)
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        return orjson.loads(response.content)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         st.error(f"Error fetching gurukul offerings: {e}")
         return []
 
+@caches_endpoint('/gurukul')
+@st.cache_data(ttl=60, show_spinner=False)
 def get_all_gurukuls_for_dropdown():
     """Fetches all gurukuls (gid, gname) for use in dropdowns (for display purposes)."""
     try:
-        response = requests.get(f"{API_BASE_URL}/gurukul")
+        response = get_http_session().get(f"{API_BASE_URL}/gurukul", timeout=API_TIMEOUT)
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        return orjson.loads(response.content)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         st.error(f"Error fetching gurukuls for dropdown: {e}")
         return []
 
+def clear_milestones_cache():
+    """Clears every page's cached milestones (and the levels derived from them) after a milestone
+    mutation, plus the students whose milestone assignments it may change."""
+    clear_endpoint_caches('/milestones', '/students')
+
 
 # --- Streamlit UI for Milestone Management ---
 
@@ -97,21 +111,35 @@ def milestones_manage_page():
     st.header("Manage Milestones")
     st.write("Here you can create, view, update, and delete Milestones.")
 
-    # Fetch all necessary data
-    all_milestones = get_all_milestones()
-    all_gurukul_offerings = get_all_gurukul_offerings()
-    all_gurukuls = get_all_gurukuls_for_dropdown()
+    # Fetch all necessary data; the three lists are independent, so fetch them concurrently
+    all_milestones, all_gurukul_offerings, all_gurukuls = fetch_in_parallel(
+        get_all_milestones, get_all_gurukul_offerings, get_all_gurukuls_for_dropdown
+    )
 
     # Create maps for easy lookup
-    gurukul_id_to_name_map = {g['gid']: g['gname'] for g in all_gurukuls}
     offering_id_to_details_map = {o['oid']: o for o in all_gurukul_offerings}
-    
-    # Group existing milestones by offering (oid) and level to prevent duplicates
+    milestones_by_mid = {m['mid']: m for m in all_milestones}
+
+    # Selectboxes take the ids as options and render these labels via format_func,
+    # so the selected value is the id itself and never has to be parsed back out.
+    # The labels are built from the lists above, so every id on this rerun has one
+    gurukul_labels = {g['gid']: f"{g['gname']} (ID: {g['gid']})" for g in all_gurukuls}
+    offering_labels_by_gid = {}
+    for o in all_gurukul_offerings:
+        offering_labels_by_gid.setdefault(o['gid'], {})[o['oid']] = f"OID: {o['oid']} (Type: {o['gtype']})"
+    milestone_labels = {
+        m['mid']: f"ID: {m['mid']} (Level: {m['level']})"
+        for m in sorted(all_milestones, key=lambda x: x['mid'])
+    }
+
+    # Index milestones and their levels by offering (oid) so the selectors below are dict lookups
+    # and duplicate levels can be prevented
     # This assumes a milestone is unique by (oid, level)
-    milestone_oid_level_map = {}
+    milestones_by_oid = defaultdict(list)
+    levels_by_oid = defaultdict(set)
     for m in all_milestones:
-        key = (m['oid'], m['level'])
-        milestone_oid_level_map[key] = m['mid']
+        milestones_by_oid[m['oid']].append(m)
+        levels_by_oid[m['oid']].add(m['level'])
 
 
     # --- Create New Milestone Section ---
@@ -122,59 +150,54 @@ def milestones_manage_page():
         return # Exit function if no gurukuls
 
     # 1. Select Gurukul for Creation
-    gurukul_display_options_create = [f"{g['gname']} (ID: {g['gid']})" for g in all_gurukuls]
-    selected_gurukul_create_display = st.selectbox(
+    selected_gurukul_create_id = st.selectbox(
         "Select Gurukul for new Milestone",
-        options=gurukul_display_options_create,
+        options=list(gurukul_labels),
+        format_func=gurukul_labels.get,
         key="create_milestone_gurukul_select"
     )
-    selected_gurukul_create_id = int(selected_gurukul_create_display.split("(ID: ")[1][:-1]) if selected_gurukul_create_display else None
 
     # Filter offerings based on selected Gurukul
-    filtered_offerings_for_create = [
-        o for o in all_gurukul_offerings if o['gid'] == selected_gurukul_create_id
-    ]
-    offering_display_options_create = []
-    if filtered_offerings_for_create:
-        for o in filtered_offerings_for_create:
-            offering_display_options_create.append(f"OID: {o['oid']} (Type: {o['gtype']})")
-    else:
-        st.info(f"No Gurukul Offerings found for '{selected_gurukul_create_display}'. Please create offerings for this Gurukul first.")
+    offering_labels_create = offering_labels_by_gid.get(selected_gurukul_create_id, {})
+    if not offering_labels_create:
+        st.info(f"No Gurukul Offerings found for '{gurukul_labels.get(selected_gurukul_create_id)}'. Please create offerings for this Gurukul first.")
         st.markdown("---")
         return # Exit if no offerings for selected gurukul
 
     # 2. Select Offering for Creation (filtered by Gurukul)
-    selected_offering_create_display = st.selectbox(
+    selected_offering_create_oid = st.selectbox(
         "Select Parent Gurukul Offering (OID) for new Milestone",
-        options=offering_display_options_create,
+        options=list(offering_labels_create),
+        format_func=offering_labels_create.get,
         key="create_milestone_offering_select"
     )
     
-    selected_offering_create_oid = None
     selected_offering_gtype = None
-    if selected_offering_create_display:
-        selected_offering_create_oid = int(selected_offering_create_display.split("OID: ")[1].split(" ")[0])
+    if selected_offering_create_oid is not None:
         selected_offering_details = offering_id_to_details_map.get(selected_offering_create_oid)
         if selected_offering_details:
             selected_offering_gtype = selected_offering_details['gtype']
 
     # Dynamic filtering of Levels based on selected Gurukul Offering's gtype
-    available_levels_for_creation_current_selection = []
-    if selected_offering_gtype:
-        all_levels_for_gtype = LEVEL_MAPPING.get(selected_offering_gtype, [])
-        existing_levels_for_oid = {level for oid, level in milestone_oid_level_map if oid == selected_offering_create_oid}
+    if selected_offering_gtype is None:
+        # No offering (or no gtype) selected yet, e.g. on first render: nothing to filter
+        available_levels_for_creation_current_selection = []
+        existing_levels_for_oid = frozenset()
+    else:
+        all_levels_for_gtype = LEVEL_MAPPING.get(selected_offering_gtype, ())
+        existing_levels_for_oid = levels_by_oid.get(selected_offering_create_oid, set())
         
         available_levels_for_creation_current_selection = [
             lvl for lvl in all_levels_for_gtype if lvl not in existing_levels_for_oid
         ]
-        available_levels_for_creation_current_selection.sort()
 
     # --- Debugging Information (Create Section) ---
-    print(f"DEBUG (Create): Selected Gurukul ID: {selected_gurukul_create_id}")
-    print(f"DEBUG (Create): Selected Offering OID: {selected_offering_create_oid}")
-    print(f"DEBUG (Create): Selected Offering GType: {selected_offering_gtype}")
-    print(f"DEBUG (Create): Existing Levels for this OID: {list(existing_levels_for_oid) if selected_offering_create_oid else 'N/A'}")
-    print(f"DEBUG (Create): Available Levels for dropdown: {available_levels_for_creation_current_selection}")
+    if DEBUG:
+        print(f"DEBUG (Create): Selected Gurukul ID: {selected_gurukul_create_id}")
+        print(f"DEBUG (Create): Selected Offering OID: {selected_offering_create_oid}")
+        print(f"DEBUG (Create): Selected Offering GType: {selected_offering_gtype}")
+        print(f"DEBUG (Create): Existing Levels for this OID: {list(existing_levels_for_oid) if selected_offering_create_oid else 'N/A'}")
+        print(f"DEBUG (Create): Available Levels for dropdown: {available_levels_for_creation_current_selection}")
     # --- End Debugging Information ---
 
     with st.form("create_milestone_form"):
@@ -199,6 +222,7 @@ def milestones_manage_page():
                     result = create_milestone(milestone_class, new_level, selected_offering_create_oid)
                     if result:
                         st.success(f"Milestone (ID: {result['mid']}, Level: {result['level']}) created successfully!")
+                        clear_milestones_cache()
                         st.rerun()
                     else:
                         st.error("Failed to create milestone. This might be a duplicate or refer to a non-existent Gurukul Offering. Please check API logs.")
@@ -210,27 +234,15 @@ def milestones_manage_page():
     # --- List Existing Milestones Section ---
     st.subheader("Existing Milestones")
     if all_milestones:
-        # Enhance with Gurukul and Offering names for better display
-        displayed_milestones = []
-        for m in all_milestones:
-            offering_details = offering_id_to_details_map.get(m['oid'])
-            gurukul_name = "N/A"
-            offering_type = "N/A"
-            if offering_details:
-                gurukul_name = gurukul_id_to_name_map.get(offering_details['gid'], "N/A")
-                offering_type = offering_details['gtype']
-            
-            displayed_milestones.append({
-                "mid": m['mid'],
-                "class": m['class'],
-                "level": m['level'],
-                "oid": m['oid'],
-                "offering_type": offering_type,
-                "gurukul_name": gurukul_name
-            })
-        
-        df_milestones = pd.DataFrame(displayed_milestones)
-        df_milestones = df_milestones[['mid', 'class', 'level', 'offering_type', 'gurukul_name', 'oid']]
+        # Enhance with Gurukul and Offering names for better display, joined with vectorized merges
+        df_milestones = (
+            pd.DataFrame(all_milestones, columns=['mid', 'class', 'level', 'oid'])
+            .merge(pd.DataFrame(all_gurukul_offerings, columns=['oid', 'gid', 'gtype']), on='oid', how='left')
+            .merge(pd.DataFrame(all_gurukuls, columns=['gid', 'gname']), on='gid', how='left')
+            .rename(columns={'gtype': 'offering_type', 'gname': 'gurukul_name'})
+            .reindex(columns=['mid', 'class', 'level', 'offering_type', 'gurukul_name', 'oid'])
+            .fillna({'offering_type': "N/A", 'gurukul_name': "N/A"})
+        )
         st.dataframe(df_milestones, use_container_width=True)
     else:
         st.info("No milestones found yet.")
@@ -250,65 +262,49 @@ def milestones_manage_page():
         return # Exit if no gurukuls
 
     # 1. Select Gurukul for Update
-    gurukul_display_options_update = [f"{g['gname']} (ID: {g['gid']})" for g in all_gurukuls]
-    selected_gurukul_update_display = st.selectbox(
+    selected_gurukul_update_id = st.selectbox(
         "Select Gurukul for Milestone Update",
-        options=gurukul_display_options_update,
+        options=list(gurukul_labels),
+        format_func=gurukul_labels.get,
         key="update_milestone_gurukul_select"
     )
-    selected_gurukul_update_id = int(selected_gurukul_update_display.split("(ID: ")[1][:-1]) if selected_gurukul_update_display else None
 
     # Filter offerings based on selected Gurukul
-    filtered_offerings_for_update = [
-        o for o in all_gurukul_offerings if o['gid'] == selected_gurukul_update_id
-    ]
-    offering_display_options_update = []
-    if filtered_offerings_for_update:
-        for o in filtered_offerings_for_update:
-            offering_display_options_update.append(f"OID: {o['oid']} (Type: {o['gtype']})")
-    else:
-        st.info(f"No Gurukul Offerings found for '{selected_gurukul_update_display}'. Cannot update milestones belonging to this Gurukul.")
+    offering_labels_update = offering_labels_by_gid.get(selected_gurukul_update_id, {})
+    if not offering_labels_update:
+        st.info(f"No Gurukul Offerings found for '{gurukul_labels.get(selected_gurukul_update_id)}'. Cannot update milestones belonging to this Gurukul.")
         st.markdown("---")
         return # Exit if no offerings for selected gurukul
 
     # 2. Select Offering for Update (filtered by Gurukul)
-    selected_offering_update_display = st.selectbox(
+    selected_offering_update_oid = st.selectbox(
         "Select Parent Gurukul Offering (OID) for Milestone Update",
-        options=offering_display_options_update,
+        options=list(offering_labels_update),
+        format_func=offering_labels_update.get,
         key="update_milestone_offering_select"
     )
-    selected_offering_update_oid = int(selected_offering_update_display.split("OID: ")[1].split(" ")[0]) if selected_offering_update_display else None
 
     # Filter milestones based on selected Offering
-    milestones_for_selected_offering = [
-        m for m in all_milestones if m['oid'] == selected_offering_update_oid
-    ]
+    milestones_for_selected_offering = milestones_by_oid.get(selected_offering_update_oid, [])
     if not milestones_for_selected_offering:
         st.info(f"No milestones found for the selected Gurukul Offering (OID: {selected_offering_update_oid}).")
         st.markdown("---")
         return # Exit if no milestones for selected offering
 
     # 3. Select Milestone to Update (filtered by Offering)
-    sorted_milestones_for_update = sorted(milestones_for_selected_offering, key=lambda x: x['mid'])
-    milestone_options_update = {
-        f"ID: {m['mid']} (Level: {m['level']})": m['mid'] 
-        for m in sorted_milestones_for_update
-    }
-    selected_milestone_display = st.selectbox(
+    selected_milestone_id = st.selectbox(
         "Select Specific Milestone to Update",
-        options=list(milestone_options_update.keys()),
+        options=sorted(m['mid'] for m in milestones_for_selected_offering),
+        format_func=milestone_labels.get,
         key="select_specific_milestone_to_update"
     )
-    selected_milestone_id = milestone_options_update.get(selected_milestone_display)
 
     # Initialize variables with default/safe values
     initial_class = 1 
     initial_oid = selected_offering_update_oid # Default to the currently selected offering's OID
     initial_level = None
     
-    current_milestone_obj = None
-    if selected_milestone_id is not None:
-        current_milestone_obj = next((m for m in all_milestones if m['mid'] == selected_milestone_id), None)
+    current_milestone_obj = milestones_by_mid.get(selected_milestone_id)
 
     if current_milestone_obj:
         initial_class = current_milestone_obj['class']
@@ -317,29 +313,26 @@ def milestones_manage_page():
 
     updated_offering_details_gtype = offering_id_to_details_map.get(initial_oid, {}).get('gtype')
 
+    # Levels already used by the current milestone's offering, excluding its own level
+    existing_levels_for_selected_oid_excluding_current = levels_by_oid.get(initial_oid, set()) - {initial_level}
+
     # Calculate available levels based on the *current/selected* OID's gtype
     available_levels_for_update = []
     if updated_offering_details_gtype:
-        all_levels_for_updated_gtype = LEVEL_MAPPING.get(updated_offering_details_gtype, [])
-        
-        existing_levels_for_selected_oid_excluding_current = set()
-        for oid_key, level_key in milestone_oid_level_map:
-            if oid_key == initial_oid: # Check against the initial_oid which is the current milestone's oid
-                if not (oid_key == initial_oid and level_key == initial_level and milestone_oid_level_map.get((oid_key, level_key)) == selected_milestone_id):
-                    existing_levels_for_selected_oid_excluding_current.add(level_key)
+        all_levels_for_updated_gtype = LEVEL_MAPPING.get(updated_offering_details_gtype, ())
         
         available_levels_for_update = [
             lvl for lvl in all_levels_for_updated_gtype if lvl not in existing_levels_for_selected_oid_excluding_current
         ]
-    available_levels_for_update.sort()
 
     # --- Debugging Information (Update Section) ---
-    print(f"DEBUG (Update): Selected Milestone ID: {selected_milestone_id}")
-    print(f"DEBUG (Update): Current OID: {initial_oid}, Current Level: {initial_level}, Current Class: {initial_class}")
-    print(f"DEBUG (Update): GType of current Offering ({initial_oid}): {updated_offering_details_gtype}")
-    print(f"DEBUG (Update): Levels defined for GType: {LEVEL_MAPPING.get(updated_offering_details_gtype, [])}")
-    print(f"DEBUG (Update): Existing Levels for current OID (excluding current milestone's): {list(existing_levels_for_selected_oid_excluding_current)}")
-    print(f"DEBUG (Update): Available Levels for new Level dropdown: {available_levels_for_update}")
+    if DEBUG:
+        print(f"DEBUG (Update): Selected Milestone ID: {selected_milestone_id}")
+        print(f"DEBUG (Update): Current OID: {initial_oid}, Current Level: {initial_level}, Current Class: {initial_class}")
+        print(f"DEBUG (Update): GType of current Offering ({initial_oid}): {updated_offering_details_gtype}")
+        print(f"DEBUG (Update): Levels defined for GType: {LEVEL_MAPPING.get(updated_offering_details_gtype, ())}")
+        print(f"DEBUG (Update): Existing Levels for current OID (excluding current milestone's): {list(existing_levels_for_selected_oid_excluding_current)}")
+        print(f"DEBUG (Update): Available Levels for new Level dropdown: {available_levels_for_update}")
     # --- End Debugging Information ---
 
 
@@ -391,6 +384,7 @@ def milestones_manage_page():
                     result = update_milestone(selected_milestone_id, **update_payload)
                     if result:
                         st.success(f"Milestone ID {result['mid']} updated successfully!")
+                        clear_milestones_cache()
                         st.rerun()
                     else:
                         st.error("Failed to update milestone. This might be a duplicate, an invalid level for the new offering type, or refer to a non-existent Gurukul Offering. Please check API logs.")
@@ -404,13 +398,12 @@ def milestones_manage_page():
     # --- Delete Milestone Section ---
     st.subheader("Delete Milestone")
     if all_milestones:
-        milestone_options_delete = {f"ID: {m['mid']} (Level: {m['level']})": m['mid'] for m in sorted(all_milestones, key=lambda x: x['mid'])}
-        selected_milestone_display_delete = st.selectbox(
+        selected_milestone_id_delete = st.selectbox(
             "Select Milestone to Delete",
-            options=list(milestone_options_delete.keys()),
+            options=list(milestone_labels),
+            format_func=milestone_labels.get,
             key="delete_milestone_select"
         )
-        selected_milestone_id_delete = milestone_options_delete.get(selected_milestone_display_delete)
 
         if st.button("Delete Milestone", key="delete_milestone_button"):
             if selected_milestone_id_delete is not None:
@@ -426,6 +419,7 @@ def milestones_manage_page():
                     if success:
                         st.success(f"Milestone ID {selected_milestone_id_delete} deleted successfully!")
                         del st.session_state.confirm_delete_milestone_id
+                        clear_milestones_cache()
                         st.rerun()
                     else:
                         st.error("Failed to delete milestone. Please check API logs.")
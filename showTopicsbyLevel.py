@@ -1,35 +1,68 @@
 # showTopicsbyLevel.py
 import streamlit as st
 import requests
+from collections import defaultdict
 import pandas as pd
-import re # Import the regular expression module
 
 # --- Configuration ---
 #API_BASE_URL = "http://localhost:5002" # Your Node.js API URL
 from config import API_BASE_URL
+from api_session import get_http_session, API_TIMEOUT, fetch_in_parallel, caches_endpoint
 
 # --- API Interaction Functions ---
 
+@caches_endpoint('/subjects')
+@st.cache_data(ttl=60, show_spinner=False)
 def get_all_subjects_api():
     """Fetches all subjects from the backend API."""
     try:
-        response = requests.get(f"{API_BASE_URL}/subjects")
+        response = get_http_session().get(f"{API_BASE_URL}/subjects", timeout=API_TIMEOUT)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
         st.error(f"Error fetching subjects: {e}")
         return []
 
+@caches_endpoint('/topics')
+@st.cache_data(ttl=60, show_spinner=False)
 def get_all_topics_api():
     """Fetches all topics from the backend API."""
     try:
-        response = requests.get(f"{API_BASE_URL}/topics")
+        response = get_http_session().get(f"{API_BASE_URL}/topics", timeout=API_TIMEOUT)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
         st.error(f"Error fetching topics: {e}")
         return []
 
+@caches_endpoint('/topics')
+@st.cache_data(ttl=60, show_spinner=False)
+def get_topics_dataframe():
+    """Builds the topics DataFrame, indexed by subid, so the page can look up a subject's topics."""
+    df_topics = pd.DataFrame(get_all_topics_api(), columns=['tid', 'tname', 'subid', 'image_url'])
+    # A sorted subid index turns the per-subject filter into an index lookup instead of a full scan
+    return df_topics.set_index('subid', drop=False).sort_index(kind='stable')
+
+@caches_endpoint('/subjects')
+@st.cache_data(ttl=60, show_spinner=False)
+def get_subject_maps():
+    """Builds the subject lookups and the level/subject dropdown data."""
+    all_subjects = get_all_subjects_api()
+    subject_id_to_name_map = {s['subid']: s['subname'] for s in all_subjects}
+    # "Name (Level: X, ID: Y)" labels keyed by subid, in label order so the dropdown needs no sort
+    subject_labels = dict(sorted(
+        ((s['subid'], f"{s['subname']} (Level: {s.get('level', 'N/A')}, ID: {s['subid']})") for s in all_subjects),
+        key=lambda item: item[1]
+    ))
+    level_by_subid = {s['subid']: s.get('level') for s in all_subjects}
+    # Subids per level, kept in label order
+    subids_by_level = defaultdict(list)
+    for subid in subject_labels:
+        subids_by_level[level_by_subid[subid]].append(subid)
+    # Unique levels, excluding None, sorted
+    unique_levels = sorted(level for level in subids_by_level if level is not None)
+    return subject_id_to_name_map, subject_labels, dict(subids_by_level), unique_levels
+
 # --- Streamlit UI ---
 
 def show_topics_by_level_page():
@@ -37,19 +70,15 @@ def show_topics_by_level_page():
     st.header("View Topics by Level and Subject")
     st.write("First, select a Level, then a Subject within that Level to view its associated topics.")
 
-    all_subjects = get_all_subjects_api()
-    all_topics = get_all_topics_api()
-
-    # Create a map for subject ID to name lookup
-    subject_id_to_name_map = {s['subid']: s['subname'] for s in all_subjects}
+    # Subjects and topics are independent, so fetch them concurrently
+    subject_maps, df_all_topics = fetch_in_parallel(get_subject_maps, get_topics_dataframe)
+    subject_id_to_name_map, subject_labels, subids_by_level, unique_levels = subject_maps
 
-    if not all_subjects:
+    if not subject_id_to_name_map:
         st.info("No subjects found. Please ensure subjects are created in the 'Manage Subjects' section.")
         return
 
     # --- Select Level ---
-    # Get unique levels, excluding None, and sort them
-    unique_levels = sorted(list(set([s.get('level') for s in all_subjects if s.get('level') is not None])))
     level_options = ["--- Select a Level ---"] + unique_levels
 
     selected_level = st.selectbox(
@@ -61,68 +90,53 @@ def show_topics_by_level_page():
     st.markdown("---")
 
     # Filter subjects based on selected level
-    filtered_subjects_by_level = []
     if selected_level == "--- Select a Level ---":
-        filtered_subjects_by_level = all_subjects # Show all subjects if no level is selected
+        filtered_subids_by_level = list(subject_labels) # Show all subjects if no level is selected
     else:
-        filtered_subjects_by_level = [
-            s for s in all_subjects if s.get('level') == selected_level
-        ]
+        filtered_subids_by_level = subids_by_level.get(selected_level, [])
     
-    if not filtered_subjects_by_level and selected_level != "--- Select a Level ---": # Only show info if a specific level chosen but no subjects found
+    if not filtered_subids_by_level and selected_level != "--- Select a Level ---": # Only show info if a specific level chosen but no subjects found
         st.info(f"No subjects found for Level: '{selected_level}'.")
         # No return here, so user can still change level or subject selection
     
     # --- Select Subject (filtered by level) ---
-    subject_options = ["--- Select a Subject ---"] + sorted(
-        [f"{s['subname']} (Level: {s.get('level', 'N/A')}, ID: {s['subid']})" for s in filtered_subjects_by_level]
-    )
+    # The options are the subids themselves (None for the placeholder), already in label order,
+    # so the selection needs no parsing back out of its display string
+    subject_options = [None] + filtered_subids_by_level
 
     # Use a unique key for this selectbox as well
-    selected_subject_display = st.selectbox(
+    selected_subject_id = st.selectbox(
         "Select a Subject",
         options=subject_options,
+        format_func=lambda subid: subject_labels.get(subid, "--- Select a Subject ---"),
         key="select_subject_for_topics_by_level_view" # Changed key for uniqueness
     )
 
-    selected_subject_id = None
-    if selected_subject_display != "--- Select a Subject ---":
-        try:
-            # Extract ID from string format: "SubjectName (Level: X, ID: Y)"
-            match = re.search(r"ID:\s*(\d+)\)", selected_subject_display)
-            if match:
-                selected_subject_id = int(match.group(1))
-            else:
-                st.error("Error parsing subject ID: Cannot find expected 'ID: <number>)' format.")
-                selected_subject_id = None
-        except ValueError:
-            st.error("Error converting subject ID to number. Please select a valid subject.")
-            selected_subject_id = None
-
     st.markdown("---")
 
     # --- Display Topics ---
-    if selected_subject_id is not None:
-        st.subheader(f"Topics for: {subject_id_to_name_map.get(selected_subject_id, 'N/A')}")
-        
-        # Filter topics based on the selected subject ID
-        filtered_topics = [
-            topic for topic in all_topics if topic.get('subid') == selected_subject_id
-        ]
-
-        if filtered_topics:
-            display_topics_data = []
-            for topic in filtered_topics:
-                display_topics_data.append({
-                    "Topic ID": topic['tid'],
-                    "Topic Name": topic['tname'],
-                    "Subject Name": subject_id_to_name_map.get(topic['subid'], 'N/A'),
-                    "Image URL": topic.get('image_url', 'N/A')
-                })
-            df_topics = pd.DataFrame(display_topics_data)
-            st.dataframe(df_topics, use_container_width=True)
-        else:
-            st.info(f"No topics found for '{subject_id_to_name_map.get(selected_subject_id, 'N/A')}'.")
-    else:
+    # Nothing more to render until a subject is chosen
+    if selected_subject_id is None:
         st.info("Please select a Level and a Subject from the dropdowns above to view its topics.")
+        return
 
+    st.subheader(f"Topics for: {subject_id_to_name_map.get(selected_subject_id, 'N/A')}")
+    
+    # Look up the topics of the selected subject ID in the subid index
+    if selected_subject_id in df_all_topics.index:
+        df_topics = df_all_topics.loc[[selected_subject_id]]
+        # Add the subject name and let column_config label the columns at render time
+        st.dataframe(
+            df_topics.assign(subname=df_topics['subid'].map(subject_id_to_name_map).fillna('N/A')),
+            column_order=['tid', 'tname', 'subname', 'image_url'],
+            column_config={
+                'tid': "Topic ID",
+                'tname': "Topic Name",
+                'subname': "Subject Name",
+                'image_url': st.column_config.LinkColumn("Image URL")
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+    else:
+        st.info(f"No topics found for '{subject_id_to_name_map.get(selected_subject_id, 'N/A')}'.")
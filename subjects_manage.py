@@ -1,29 +1,36 @@
 # subjects_manage.py
 import streamlit as st
 import requests
-import pandas as pd
+import time
+from itertools import chain
 
 # --- Configuration ---
 #API_BASE_URL = "http://localhost:5002" # Your Node.js API URL
-from config import API_BASE_URL
+from config import API_BASE_URL, DEBUG
+from api_session import get_http_session, API_TIMEOUT, fetch_in_parallel, caches_endpoint, clear_endpoint_caches
 
 # --- Level Mapping (MUST be consistent with API) ---
 # This is used as a reference for all possible levels, but actual available levels
 # are fetched from the milestones API.
+# Levels are listed in their natural order, so filtered level lists keep that order without sorting
 LEVEL_MAPPING = {
-    "G1": ["L1", "L2", "L3", "L4"],
-    "G2": ["L5", "L6", "L7", "L8"],
-    "G3": ["L9", "L10", "L11", "L12"],
-    "G4": ["L13", "L14", "L15", "L16"],
+    "G1": ("L1", "L2", "L3", "L4"),
+    "G2": ("L5", "L6", "L7", "L8"),
+    "G3": ("L9", "L10", "L11", "L12"),
+    "G4": ("L13", "L14", "L15", "L16"),
 }
-ALL_POSSIBLE_LEVELS = sorted(list(set(level for levels in LEVEL_MAPPING.values() for level in levels)))
+ALL_POSSIBLE_LEVELS = tuple(chain.from_iterable(LEVEL_MAPPING.values()))
+
+# How long a fetched subject list is cached; changes made on this page are overlaid for that long
+SUBJECTS_CACHE_TTL = 60
 
 # --- API Interaction Functions for Subjects ---
 
+@st.cache_data(ttl=SUBJECTS_CACHE_TTL, show_spinner=False)
 def get_all_subjects():
     """Fetches all subjects from the backend API."""
     try:
-        response = requests.get(f"{API_BASE_URL}/subjects")
+        response = get_http_session().get(f"{API_BASE_URL}/subjects", timeout=API_TIMEOUT)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -36,7 +43,7 @@ def create_subject(subname, level, image_url):
         payload = {"subname": subname, "level": level}
         if image_url: # Only add image_url if it's not empty
             payload["image_url"] = image_url
-        response = requests.post(f"{API_BASE_URL}/subjects", json=payload)
+        response = get_http_session().post(f"{API_BASE_URL}/subjects", json=payload, timeout=API_TIMEOUT)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -54,7 +61,7 @@ def update_subject(subid, subname=None, level=None, image_url=None):
         payload["image_url"] = image_url
     
     try:
-        response = requests.put(f"{API_BASE_URL}/subjects/{subid}", json=payload)
+        response = get_http_session().put(f"{API_BASE_URL}/subjects/{subid}", json=payload, timeout=API_TIMEOUT)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -64,58 +71,96 @@ def update_subject(subid, subname=None, level=None, image_url=None):
 def delete_subject(subid):
     """Deletes a subject."""
     try:
-        response = requests.delete(f"{API_BASE_URL}/subjects/{subid}")
+        response = get_http_session().delete(f"{API_BASE_URL}/subjects/{subid}", timeout=API_TIMEOUT)
         response.raise_for_status()
         return response.status_code == 200
     except requests.exceptions.RequestException as e:
         st.error(f"Error deleting subject: {e}")
         return False
 
+# --- Local (optimistic) Subject Changes ---
+
+def record_subject_change(subid, subject=None):
+    """Remembers a subject this session created or updated (subject given) or deleted (subject None)."""
+    st.session_state.setdefault('local_subject_changes', {})[subid] = (time.monotonic(), subject)
+
+def apply_local_subject_changes(all_subjects):
+    """Overlays this session's recent creates, updates and deletes on the cached subject list,
+    so a mutation only needs a rerun and not a refetch."""
+    changes = st.session_state.get('local_subject_changes')
+    if not changes:
+        return all_subjects
+    # Any list fetched after a change includes it, and every list cached before it expires within the TTL
+    now = time.monotonic()
+    for subid in [subid for subid, (changed_at, _) in changes.items() if now - changed_at > SUBJECTS_CACHE_TTL]:
+        del changes[subid]
+    subjects_by_id = {s['subid']: s for s in all_subjects}
+    for subid, (_, subject) in changes.items():
+        if subject is None:
+            subjects_by_id.pop(subid, None)
+        else:
+            subjects_by_id[subid] = subject
+    return list(subjects_by_id.values())
+
+def clear_other_subject_caches():
+    """Clears the other pages' cached subjects after a subject mutation. Renames show up in teacher
+    assignments, and deleting a subject also deletes its topics (and their subtopics)."""
+    # This page's own list is not registered for '/subjects'; it is overlaid via record_subject_change
+    clear_endpoint_caches('/subjects', '/topics', '/subtopics', '/teachers')
+
 # --- API Interaction Function for Milestones (to get distinct levels) ---
 
+@caches_endpoint('/milestones')
+@st.cache_data(ttl=60, show_spinner=False)
 def get_distinct_milestone_levels():
     """Fetches all distinct levels present in the milestones table from the backend API."""
     try:
-        response = requests.get(f"{API_BASE_URL}/milestones/distinct-levels")
+        response = get_http_session().get(f"{API_BASE_URL}/milestones/distinct-levels", timeout=API_TIMEOUT)
         response.raise_for_status() # This will raise an exception for 4xx/5xx responses
 
         levels_data = response.json()
         
         # --- Debugging Information for API Response ---
-        print(f"DEBUG: Raw API response JSON for distinct levels: {levels_data}")
-        print(f"DEBUG: Type of levels_data: {type(levels_data)}")
+        if DEBUG:
+            print(f"DEBUG: Raw API response JSON for distinct levels: {levels_data}")
+            print(f"DEBUG: Type of levels_data: {type(levels_data)}")
         # --- End Debugging Information ---
 
         if not isinstance(levels_data, list):
             st.error(f"API response for distinct levels was not a list. Type: {type(levels_data)}, Content: {levels_data}")
-            return []
+            return frozenset()
 
         # List to hold the extracted levels
         extracted_levels = []
         for i, item in enumerate(levels_data):
-            # --- Debugging Information for List Items ---
-            print(f"DEBUG: Processing item {i}: {item}, Type: {type(item)}")
-            # --- End Debugging Information ---
             if isinstance(item, str): # Corrected: Expect string directly
                 extracted_levels.append(item)
             else:
                 st.error(f"API response item {i} for distinct levels was not a string as expected. Item: {item}")
                 # For robustness, we will continue and just skip this malformed item.
                 
+        if DEBUG:
+            print(f"DEBUG: Processed {len(levels_data)} distinct level items, kept {len(extracted_levels)}")
+
         if not extracted_levels:
             st.warning("No valid 'level' data (as strings) found in the distinct milestones API response. Check your database or API endpoint.")
             
-        return sorted(extracted_levels)
+        # Only membership is checked against these, so a frozenset is enough
+        return frozenset(extracted_levels)
 
     except requests.exceptions.RequestException as e:
         st.error(f"Error fetching distinct milestone levels (RequestException): {e}")
-        return []
+        return frozenset()
     except ValueError: # Catch JSON decoding errors if response.json() fails
         st.error(f"API response for distinct levels was not valid JSON. Response text: {response.text}")
-        return []
+        return frozenset()
     except Exception as e:
         st.error(f"An unexpected error occurred while fetching distinct milestone levels: {e}")
-        return []
+        return frozenset()
+
+def get_available_levels(possible_levels, existing_levels):
+    """Returns the possible levels (in their natural order) that exist in the milestones table."""
+    return [lvl for lvl in possible_levels if lvl in existing_levels]
 
 # --- Streamlit UI for Subject Management ---
 
@@ -124,15 +169,20 @@ def subjects_manage_page():
     st.header("Manage Subjects")
     st.write("Here you can create, view, update, and delete Subjects.")
 
-    # Fetch all necessary data
-    all_subjects = get_all_subjects()
-    # Fetch distinct levels that actually exist in the milestones table
-    existing_milestone_levels = get_distinct_milestone_levels()
+    # Fetch all subjects and the distinct levels that actually exist in the milestones table;
+    # the two are independent, so fetch them concurrently
+    all_subjects, existing_milestone_levels = fetch_in_parallel(get_all_subjects, get_distinct_milestone_levels)
+    all_subjects = apply_local_subject_changes(all_subjects)
 
     # Filter ALL_POSSIBLE_LEVELS to only include those present in existing_milestone_levels
-    available_levels_for_subjects = sorted([
-        lvl for lvl in ALL_POSSIBLE_LEVELS if lvl in existing_milestone_levels
-    ])
+    available_levels_for_subjects = get_available_levels(ALL_POSSIBLE_LEVELS, existing_milestone_levels)
+
+    # Build the subject selectbox options (sorted by ID) and an ID lookup once for the Update and Delete sections
+    subject_options = {
+        f"ID: {s['subid']} ({s['subname']} - {s['level']})": s['subid']
+        for s in sorted(all_subjects, key=lambda x: x['subid'])
+    }
+    subjects_by_id = {s['subid']: s for s in all_subjects}
 
     if not available_levels_for_subjects:
         st.warning("No levels (L1-L16) found in the Milestones table. Cannot create/update subjects until milestones are added with defined levels.")
@@ -162,6 +212,8 @@ def subjects_manage_page():
                     result = create_subject(new_subname, new_level, new_image_url)
                     if result:
                         st.success(f"Subject '{result['subname']}' (ID: {result['subid']}) created successfully!")
+                        record_subject_change(result['subid'], result)
+                        clear_other_subject_caches()
                         st.rerun()
                     else:
                         st.error("Failed to create subject. Please check API logs. Ensure 'level' is valid and unique if applicable.")
@@ -173,11 +225,10 @@ def subjects_manage_page():
     # --- List Existing Subjects Section ---
     st.subheader("Existing Subjects")
     if all_subjects:
-        df_subjects = pd.DataFrame(all_subjects)
-        # Filter out 'isdeleted' column for display if it's always false for active subjects
-        if 'isdeleted' in df_subjects.columns:
-            df_subjects = df_subjects.drop(columns=['isdeleted'])
-        st.dataframe(df_subjects, use_container_width=True)
+        # Filter out 'isdeleted' column for display if it's always false for active subjects;
+        # st.dataframe takes the rows as plain dicts, so no DataFrame is needed
+        subject_rows = [{k: v for k, v in s.items() if k != 'isdeleted'} for s in all_subjects]
+        st.dataframe(subject_rows, use_container_width=True)
     else:
         st.info("No subjects found yet.")
 
@@ -186,11 +237,6 @@ def subjects_manage_page():
     # --- Update Existing Subject Section ---
     st.subheader("Update Existing Subject")
     if all_subjects:
-        sorted_subjects = sorted(all_subjects, key=lambda x: x['subid'])
-        subject_options = {
-            f"ID: {s['subid']} ({s['subname']} - {s['level']})": s['subid'] 
-            for s in sorted_subjects
-        }
         selected_subject_display = st.selectbox(
             "Select Subject to Update",
             options=list(subject_options.keys()),
@@ -198,9 +244,7 @@ def subjects_manage_page():
         )
         selected_subject_id = subject_options.get(selected_subject_display)
 
-        current_subject_obj = None
-        if selected_subject_id is not None:
-            current_subject_obj = next((s for s in all_subjects if s['subid'] == selected_subject_id), None)
+        current_subject_obj = subjects_by_id.get(selected_subject_id)
 
         if current_subject_obj:
             with st.form("update_subject_form"):
@@ -246,23 +290,26 @@ def subjects_manage_page():
                                 update_payload['image_url'] = updated_image_url
                             
                             # --- Debugging Information (Update Section) ---
-                            st.info(f"DEBUG (Update): Selected Subject ID: {selected_subject_id}")
-                            st.info(f"DEBUG (Update): Initial Data: Name='{initial_subname}', Level='{initial_level}', Image='{initial_image_url}'")
-                            st.info(f"DEBUG (Update): Updated Data: Name='{updated_subname}', Level='{updated_level}', Image='{updated_image_url}'")
-                            st.info(f"DEBUG (Update): Payload to send: {update_payload}")
+                            # Printed to the server log rather than drawn with st.info, and only when debugging
+                            if DEBUG:
+                                print(f"DEBUG (Update): Selected Subject ID: {selected_subject_id}")
+                                print(f"DEBUG (Update): Initial Data: Name='{initial_subname}', Level='{initial_level}', Image='{initial_image_url}'")
+                                print(f"DEBUG (Update): Updated Data: Name='{updated_subname}', Level='{updated_level}', Image='{updated_image_url}'")
+                                print(f"DEBUG (Update): Payload to send: {update_payload}")
                             # --- End Debugging Information ---
 
                             if not update_payload:
+                                # Nothing to send, so no rerun either; the form keeps its values
                                 st.info("No changes detected. Subject not updated.")
-                                st.rerun()
-                                return
-
-                            result = update_subject(selected_subject_id, **update_payload)
-                            if result:
-                                st.success(f"Subject ID {result['subid']} updated successfully!")
-                                st.rerun()
                             else:
-                                st.error("Failed to update subject. Please check API logs. This might be due to an invalid level or other backend validation.")
+                                result = update_subject(selected_subject_id, **update_payload)
+                                if result:
+                                    st.success(f"Subject ID {result['subid']} updated successfully!")
+                                    record_subject_change(result['subid'], result)
+                                    clear_other_subject_caches()
+                                    st.rerun()
+                                else:
+                                    st.error("Failed to update subject. Please check API logs. This might be due to an invalid level or other backend validation.")
                     else:
                         st.warning("Please select a subject, enter a name, and select a valid level.")
         else:
@@ -275,13 +322,12 @@ def subjects_manage_page():
     # --- Delete Subject Section ---
     st.subheader("Delete Subject")
     if all_subjects:
-        subject_options_delete = {f"ID: {s['subid']} ({s['subname']} - {s['level']})": s['subid'] for s in sorted(all_subjects, key=lambda x: x['subid'])}
         selected_subject_display_delete = st.selectbox(
             "Select Subject to Delete",
-            options=list(subject_options_delete.keys()),
+            options=list(subject_options.keys()),
             key="delete_subject_select"
         )
-        selected_subject_id_delete = subject_options_delete.get(selected_subject_display_delete)
+        selected_subject_id_delete = subject_options.get(selected_subject_display_delete)
 
         if st.button("Delete Subject", key="delete_subject_button"):
             if selected_subject_id_delete is not None:
@@ -297,6 +343,8 @@ def subjects_manage_page():
                     if success:
                         st.success(f"Subject ID {selected_subject_id_delete} and associated topics deleted successfully!")
                         del st.session_state.confirm_delete_subject_id
+                        record_subject_change(selected_subject_id_delete)
+                        clear_other_subject_caches()
                         st.rerun()
                     else:
                         st.error("Failed to delete subject. Please check API logs.")
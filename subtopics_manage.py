@@ -1,12 +1,13 @@
 # subtopics_manage.py
 import streamlit as st
 import requests
-import json
-import re # Import regex for parsing IDs from display strings
+import orjson
+from collections import defaultdict
 
 # --- Configuration ---
 #API_BASE_URL = "http://localhost:5002" # Your Node.js API URL
-from config import API_BASE_URL
+from config import API_BASE_URL, DEBUG
+from api_session import get_http_session, API_TIMEOUT, fetch_in_parallel, caches_endpoint, clear_endpoint_caches
 
 # --- API Interaction Functions (re-used or adapted for this module) ---
 
@@ -16,29 +17,33 @@ def direct_api_call(method, endpoint, payload=None):
     Includes robust error handling and debug logging.
     """
     url = f"{API_BASE_URL}{endpoint}" # endpoint should now directly be /subtopics or /subtopics/by-topic/X
-    headers = {"Content-Type": "application/json"}
+    # The shared session keeps connections alive and already sends the JSON Content-Type header
+    session = get_http_session()
     
     try:
-        print(f"DEBUG API CALL: Method={method}, Endpoint={endpoint}, Payload={payload}")
+        if DEBUG:
+            print(f"DEBUG API CALL: Method={method}, Endpoint={endpoint}, Payload={payload}")
         if method == 'GET':
-            response = requests.get(url, headers=headers)
+            response = session.get(url, timeout=API_TIMEOUT)
         elif method == 'POST':
-            response = requests.post(url, headers=headers, data=json.dumps(payload))
+            response = session.post(url, data=orjson.dumps(payload), timeout=API_TIMEOUT)
         elif method == 'PUT':
-            response = requests.put(url, headers=headers, data=json.dumps(payload))
+            response = session.put(url, data=orjson.dumps(payload), timeout=API_TIMEOUT)
         elif method == 'DELETE':
-            response = requests.delete(url, headers=headers)
+            response = session.delete(url, timeout=API_TIMEOUT)
         else:
             return 400, {"message": "Unsupported HTTP method"}
 
         if response.status_code == 204: # No Content
-            print(f"DEBUG API RESPONSE: Status=204 (No Content) for {endpoint}")
+            if DEBUG:
+                print(f"DEBUG API RESPONSE: Status=204 (No Content) for {endpoint}")
             return response.status_code, {}
 
         try:
-            data = response.json()
-            print(f"DEBUG API RESPONSE: Status={response.status_code}, Data={data} for {endpoint}")
-        except json.JSONDecodeError:
+            data = orjson.loads(response.content)
+            if DEBUG:
+                print(f"DEBUG API RESPONSE: Status={response.status_code}, Data={data} for {endpoint}")
+        except orjson.JSONDecodeError:
             print(f"DEBUG: JSONDecodeError for {method} {url}. Raw response content: '{response.text}'")
             return response.status_code, {"message": f"Invalid JSON response from API: {response.text}"}
 
@@ -58,35 +63,60 @@ def direct_api_call(method, endpoint, payload=None):
         return 500, {"message": f"API request error: {e}"}
 
 
-@st.cache_data(ttl=60)
+# The list fetchers return None on failure; fetch_with_last_good drops that result from the cache
+@caches_endpoint('/topics')
+@st.cache_data(ttl=60, show_spinner=False)
 def fetch_all_topics_for_subtopic_management():
     """Fetches all topics (tid, tname, subid, image_url) for use in dropdowns."""
     status, data = direct_api_call('GET', '/topics')
     if status == 200:
         return data
     st.error(f"Failed to fetch topics: {data.get('message', 'Unknown error')}")
-    return []
+    return None
 
-@st.cache_data(ttl=60)
+# Subtopics change only through this page, which clears them on every mutation, so they can be kept longer
+@caches_endpoint('/subtopics')
+@st.cache_data(ttl=300, show_spinner=False)
 def fetch_all_subtopics_for_filtering():
     """NEW: Fetches all subtopics to determine which topics have subtopics."""
     status, data = direct_api_call('GET', '/subtopics') # CORRECTED: Removed /api
     if status == 200:
         return data
     st.error(f"Failed to fetch all subtopics for filtering: {data.get('message', 'Unknown error')}")
-    return []
-
-@st.cache_data(ttl=60)
-def fetch_subtopics_by_topic(topic_id):
-    """Fetches subtopics for a given topic ID."""
-    if topic_id is None:
-        return []
-    status, data = direct_api_call('GET', f'/subtopics/by-topic/{topic_id}') # CORRECTED: Removed /api
-    if status == 200:
+    return None
+
+def fetch_with_last_good(fetcher, endpoint):
+    """Calls a cached list fetcher; if it fails, returns this session's last good copy of endpoint (or [])."""
+    data = fetcher()
+    last_good = st.session_state['last_good']
+    if data is not None:
+        # Remember the latest good copy so a later backend outage doesn't blank the dropdowns
+        last_good[endpoint] = data
         return data
-    st.error(f"Failed to fetch subtopics for Topic ID {topic_id}: {data.get('message', 'Unknown error')}")
+    # Don't keep the failure cached, so the next rerun tries the backend again
+    fetcher.clear()
+    if endpoint in last_good:
+        # Flag it for the page to report once its fetches are done
+        st.session_state.serving_last_good = True
+        return last_good[endpoint]
     return []
 
+def get_subtopics_by_topic(all_subtopics):
+    """Groups the fetched subtopics by topic ID, replacing a /subtopics/by-topic/X call per selection."""
+    subtopics_by_topic = defaultdict(list)
+    for subt in all_subtopics:
+        subtopics_by_topic[subt['topic_id']].append(subt)
+    return dict(subtopics_by_topic)
+
+def get_subtopic_update_options(subtopics):
+    """Builds the 'ID: X (Name)' -> subtid options for one topic's subtopics, sorted by ID."""
+    sorted_subtopics = sorted(subtopics, key=lambda x: x['subtid'])
+    return {f"ID: {subt['subtid']} ({subt['subtopic_name']})": subt['subtid'] for subt in sorted_subtopics}
+
+def clear_subtopics_cache():
+    """Clears every page's cached subtopics after a create or update."""
+    clear_endpoint_caches('/subtopics')
+
 def create_subtopic_api(topic_id, subtopic_name, image_url):
     """Calls the API to create a new subtopic."""
     payload = {
@@ -109,28 +139,36 @@ def subtopics_manage_page():
     st.header("Manage Subtopics")
     st.write("Here you can create, view, and update Subtopics.")
 
-    # Fetch all necessary data
-    all_topics = fetch_all_topics_for_subtopic_management()
-    all_subtopics = fetch_all_subtopics_for_filtering() # NEW: Fetch all subtopics for filtering
+    # Fetch all necessary data; topics and subtopics are independent, so fetch them concurrently.
+    # The last-good store is created here, before the worker threads that both write to it start.
+    st.session_state.setdefault('last_good', {})
+    all_topics, all_subtopics = fetch_in_parallel(
+        lambda: fetch_with_last_good(fetch_all_topics_for_subtopic_management, '/topics'),
+        lambda: fetch_with_last_good(fetch_all_subtopics_for_filtering, '/subtopics')
+    )
+    if st.session_state.pop('serving_last_good', False):
+        st.toast("Using cached data; backend unreachable")
 
     # Create maps for easy lookup
     topic_id_to_obj_map = {t['tid']: t for t in all_topics}
+    subtopics_by_topic = get_subtopics_by_topic(all_subtopics)
     
-    # Determine which topics have subtopics
-    topic_ids_with_subtopics = {subt['topic_id'] for subt in all_subtopics}
+    # Determine which topics have subtopics; the cached grouping already has one key per such topic
+    topic_ids_with_subtopics = subtopics_by_topic.keys()
 
-    # Prepare topic display options for creation (all topics)
-    topic_display_options_all = ["-- Select Topic --"] + sorted([
-        f"{t['tname']} (ID: {t['tid']})" for t in all_topics
-    ])
+    # Topic options map each display label to its tid, sorted by label, so a selection
+    # resolves to its ID with a dict lookup; the placeholder maps to None.
+    # The labels are built and sorted once and shared by both option dicts
+    sorted_topic_options = sorted((f"{t['tname']} (ID: {t['tid']})", t['tid']) for t in all_topics)
 
-    # Prepare topic display options for listing/updating (only topics with subtopics)
-    filtered_topics_for_display = [
-        t for t in all_topics if t['tid'] in topic_ids_with_subtopics
-    ]
-    topic_display_options_with_subtopics = ["-- Select Topic --"] + sorted([
-        f"{t['tname']} (ID: {t['tid']})" for t in filtered_topics_for_display
-    ])
+    # Prepare topic options for creation (all topics)
+    topic_options_all = {"-- Select Topic --": None}
+    topic_options_all.update(sorted_topic_options)
+
+    # Prepare topic options for listing/updating (only topics with subtopics), already in label order
+    filtered_topic_options = {label: tid for label, tid in sorted_topic_options if tid in topic_ids_with_subtopics}
+    topic_options_with_subtopics = {"-- Select Topic --": None}
+    topic_options_with_subtopics.update(filtered_topic_options)
 
 
     # --- Create New Subtopic Section ---
@@ -142,14 +180,10 @@ def subtopics_manage_page():
 
     selected_topic_create_display = st.selectbox(
         "Select Parent Topic for new Subtopic",
-        options=topic_display_options_all, # Use all topics for creation
+        options=list(topic_options_all), # Use all topics for creation
         key="create_subtopic_topic_select"
     )
-    selected_topic_create_id = None
-    if selected_topic_create_display != "-- Select Topic --":
-        match = re.search(r"ID: (\d+)", selected_topic_create_display)
-        if match:
-            selected_topic_create_id = int(match.group(1))
+    selected_topic_create_id = topic_options_all.get(selected_topic_create_display)
 
     with st.form("create_subtopic_form", clear_on_submit=True):
         new_subtopic_name = st.text_input("Subtopic Name", key="new_subtopic_name_input")
@@ -163,7 +197,7 @@ def subtopics_manage_page():
                     status, result = create_subtopic_api(selected_topic_create_id, new_subtopic_name, new_subtopic_image_url)
                     if status == 201:
                         st.success(f"Subtopic '{result['subtopic_name']}' (ID: {result['subtid']}) created successfully for Topic ID {result['topic_id']}!")
-                        st.cache_data.clear()
+                        clear_subtopics_cache()
                         st.rerun()
                     elif status == 409:
                         st.warning(f"Failed to create subtopic: {result.get('message', 'Subtopic with this name already exists for this topic.')}")
@@ -178,24 +212,20 @@ def subtopics_manage_page():
     st.subheader("Existing Subtopics")
 
     # NEW: Use the filtered list for the dropdown
-    if not filtered_topics_for_display:
+    if not filtered_topic_options:
         st.info("No Topics with Subtopics found. Create some above!")
         st.markdown("---")
         return
 
     selected_topic_list_display = st.selectbox(
         "Select Topic to view its Subtopics",
-        options=topic_display_options_with_subtopics, # Use filtered list here
+        options=list(topic_options_with_subtopics), # Use filtered list here
         key="list_subtopic_topic_select"
     )
-    selected_topic_list_id = None
-    if selected_topic_list_display != "-- Select Topic --":
-        match = re.search(r"ID: (\d+)", selected_topic_list_display)
-        if match:
-            selected_topic_list_id = int(match.group(1))
+    selected_topic_list_id = topic_options_with_subtopics.get(selected_topic_list_display)
 
     if selected_topic_list_id is not None:
-        subtopics = fetch_subtopics_by_topic(selected_topic_list_id)
+        subtopics = subtopics_by_topic.get(selected_topic_list_id, [])
         if subtopics:
             displayed_subtopics = []
             for subt in subtopics:
@@ -219,7 +249,7 @@ def subtopics_manage_page():
     st.subheader("Update Existing Subtopic")
 
     # NEW: Use the filtered list for the dropdown
-    if not filtered_topics_for_display:
+    if not filtered_topic_options:
         st.info("No Topics with Subtopics found to update. Create some above!")
         st.markdown("---")
         return
@@ -227,18 +257,14 @@ def subtopics_manage_page():
     # First, select the parent topic to filter subtopics
     selected_topic_update_filter_display = st.selectbox(
         "Select Parent Topic to filter Subtopics for Update",
-        options=topic_display_options_with_subtopics, # Use filtered list here
+        options=list(topic_options_with_subtopics), # Use filtered list here
         key="update_subtopic_topic_filter_select"
     )
-    selected_topic_update_filter_id = None
-    if selected_topic_update_filter_display != "-- Select Topic --":
-        match = re.search(r"ID: (\d+)", selected_topic_update_filter_display)
-        if match:
-            selected_topic_update_filter_id = int(match.group(1))
+    selected_topic_update_filter_id = topic_options_with_subtopics.get(selected_topic_update_filter_display)
 
     subtopics_for_update_selection = []
     if selected_topic_update_filter_id is not None:
-        subtopics_for_update_selection = fetch_subtopics_by_topic(selected_topic_update_filter_id)
+        subtopics_for_update_selection = subtopics_by_topic.get(selected_topic_update_filter_id, [])
 
     if not subtopics_for_update_selection:
         st.info(f"No subtopics found for Topic '{selected_topic_update_filter_display}' to update.")
@@ -246,11 +272,7 @@ def subtopics_manage_page():
         return
 
     # Then, select the specific subtopic to update
-    sorted_subtopics_for_update = sorted(subtopics_for_update_selection, key=lambda x: x['subtid'])
-    subtopic_options_update = {
-        f"ID: {subt['subtid']} ({subt['subtopic_name']})": subt['subtid'] 
-        for subt in sorted_subtopics_for_update
-    }
+    subtopic_options_update = get_subtopic_update_options(subtopics_for_update_selection)
     
     # Check if subtopic_options_update is empty before trying to access keys
     if not subtopic_options_update:
@@ -301,20 +323,18 @@ def subtopics_manage_page():
                                 update_payload['imageUrl'] = updated_image_url
                             
                             if not update_payload:
+                                # Nothing to send, so no rerun either; the form keeps its values
                                 st.info("No changes detected. Subtopic not updated.")
-                                # Use st.experimental_rerun() for older Streamlit versions, st.rerun() for newer
-                                st.rerun()
-                                return
-
-                            status, result = update_subtopic_api(selected_subtopic_id, update_payload)
-                            if status == 200:
-                                st.success(f"Subtopic ID {result['subtid']} updated successfully!")
-                                st.cache_data.clear()
-                                st.rerun()
-                            elif status == 409:
-                                st.warning(f"Failed to update subtopic: {result.get('message', 'Subtopic with this name already exists for this topic.')}")
                             else:
-                                st.error(f"Failed to update subtopic: {result.get('message', 'Unknown error')}")
+                                status, result = update_subtopic_api(selected_subtopic_id, update_payload)
+                                if status == 200:
+                                    st.success(f"Subtopic ID {result['subtid']} updated successfully!")
+                                    clear_subtopics_cache()
+                                    st.rerun()
+                                elif status == 409:
+                                    st.warning(f"Failed to update subtopic: {result.get('message', 'Subtopic with this name already exists for this topic.')}")
+                                else:
+                                    st.error(f"Failed to update subtopic: {result.get('message', 'Unknown error')}")
                 else:
                     st.warning("Please select a subtopic and enter a valid name.")
     else:
@@ -2,31 +2,37 @@
 import streamlit as st
 import requests
 import pandas as pd
-import re # Import regex for parsing IDs from display strings
 
 # --- Configuration ---
 #API_BASE_URL = "http://localhost:5002" # Your Node.js API URL
 from config import API_BASE_URL
+from api_session import get_http_session, API_TIMEOUT, fetch_in_parallel, caches_endpoint, clear_endpoint_caches
 
 # --- API Interaction Functions for Topics ---
 
+@caches_endpoint('/topics')
+@st.cache_data(ttl=60, show_spinner=False)
 def get_all_topics():
     """Fetches all topics from the backend API."""
     try:
-        response = requests.get(f"{API_BASE_URL}/topics")
+        response = get_http_session().get(f"{API_BASE_URL}/topics", timeout=API_TIMEOUT)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
         st.error(f"Error fetching topics: {e}")
         return []
 
+def clear_topics_cache():
+    """Clears every page's cached topics after a topic mutation; deleting a topic also deletes its subtopics."""
+    clear_endpoint_caches('/topics', '/subtopics')
+
 def create_topic(tname, subid, image_url):
     """Creates a new topic."""
     try:
         payload = {"tname": tname, "subid": subid}
         if image_url:
             payload["image_url"] = image_url
-        response = requests.post(f"{API_BASE_URL}/topics", json=payload)
+        response = get_http_session().post(f"{API_BASE_URL}/topics", json=payload, timeout=API_TIMEOUT)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -44,7 +50,7 @@ def update_topic(tid, tname=None, subid=None, image_url=None):
         payload["image_url"] = image_url
     
     try:
-        response = requests.put(f"{API_BASE_URL}/topics/{tid}", json=payload)
+        response = get_http_session().put(f"{API_BASE_URL}/topics/{tid}", json=payload, timeout=API_TIMEOUT)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -54,7 +60,7 @@ def update_topic(tid, tname=None, subid=None, image_url=None):
 def delete_topic(tid):
     """Deletes a topic."""
     try:
-        response = requests.delete(f"{API_BASE_URL}/topics/{tid}")
+        response = get_http_session().delete(f"{API_BASE_URL}/topics/{tid}", timeout=API_TIMEOUT)
         response.raise_for_status()
         return response.status_code == 200
     except requests.exceptions.RequestException as e:
@@ -63,11 +69,13 @@ def delete_topic(tid):
 
 # --- API Interaction Functions for Subjects (re-used) ---
 
+@caches_endpoint('/subjects')
+@st.cache_data(ttl=60, show_spinner=False)
 def get_all_subjects_for_dropdown():
     """Fetches all subjects (subid, subname, level) for use in dropdowns.
        Assumes the /subjects endpoint returns 'level' field."""
     try:
-        response = requests.get(f"{API_BASE_URL}/subjects")
+        response = get_http_session().get(f"{API_BASE_URL}/subjects", timeout=API_TIMEOUT)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -81,15 +89,18 @@ def topics_manage_page():
     st.header("Manage Topics")
     st.write("Here you can create, view, update, and delete Topics.")
 
-    # Fetch all necessary data
-    all_topics = get_all_topics()
-    all_subjects = get_all_subjects_for_dropdown()
+    # Fetch all necessary data; topics and subjects are independent, so fetch them concurrently
+    all_topics, all_subjects = fetch_in_parallel(get_all_topics, get_all_subjects_for_dropdown)
 
     # Create maps for easy lookup
     subject_id_to_name_map = {s['subid']: s['subname'] for s in all_subjects}
     # [START Change 1 - New map for full subject details]
     subject_id_to_full_obj_map = {s['subid']: s for s in all_subjects}
     # [END Change 1 - New map for full subject details]
+    # Subject selectbox labels mapped to their subid, built once so every selection resolves with a dict lookup
+    subject_display_to_id = {
+        f"{s['subname']} (Level: {s.get('level', 'N/A')}, ID: {s['subid']})": s['subid'] for s in all_subjects
+    }
     
     # Group existing topics by subject ID
     topic_subid_map = {}
@@ -108,22 +119,12 @@ def topics_manage_page():
         return # Exit function if no subjects
 
     # Select Subject for Creation
-    # [START Change 1 - Enhanced Subject Display in Create Section]
-    subject_display_options_create = [
-        f"{s['subname']} (Level: {s.get('level', 'N/A')}, ID: {s['subid']})" for s in all_subjects
-    ]
-    # [END Change 1 - Enhanced Subject Display in Create Section]
     selected_subject_create_display = st.selectbox(
         "Select Parent Subject for new Topic",
-        options=subject_display_options_create,
+        options=list(subject_display_to_id),
         key="create_topic_subject_select"
     )
-    # Extract ID using regex for robustness
-    selected_subject_create_id = None
-    if selected_subject_create_display:
-        match = re.search(r"ID: (\d+)", selected_subject_create_display)
-        if match:
-            selected_subject_create_id = int(match.group(1))
+    selected_subject_create_id = subject_display_to_id.get(selected_subject_create_display)
 
     with st.form("create_topic_form"):
         new_tname = st.text_input("Topic Name", key="new_topic_name_input")
@@ -142,6 +143,7 @@ def topics_manage_page():
                         result = create_topic(new_tname, selected_subject_create_id, new_image_url)
                         if result:
                             st.success(f"Topic '{result['tname']}' (ID: {result['tid']}) created successfully for Subject ID {result['subid']}!")
+                            clear_topics_cache()
                             st.rerun()
                         else:
                             st.error("Failed to create topic. Please check API logs.")
@@ -195,21 +197,12 @@ def topics_manage_page():
         return
 
     # 1. Select Subject for Topic Filtering (for display)
-    # [START Change 1 - Enhanced Subject Display in Update Filter Section]
-    subject_display_options_filter_update = [
-        f"{s['subname']} (Level: {s.get('level', 'N/A')}, ID: {s['subid']})" for s in all_subjects
-    ]
-    # [END Change 1 - Enhanced Subject Display in Update Filter Section]
     selected_subject_filter_update_display = st.selectbox(
         "Filter Topics by Parent Subject (for selection below)",
-        options=subject_display_options_filter_update,
+        options=list(subject_display_to_id),
         key="update_topic_subject_filter_select"
     )
-    selected_subject_filter_update_id = None
-    if selected_subject_filter_update_display:
-        match = re.search(r"ID: (\d+)", selected_subject_filter_update_display)
-        if match:
-            selected_subject_filter_update_id = int(match.group(1))
+    selected_subject_filter_update_id = subject_display_to_id.get(selected_subject_filter_update_display)
 
     # Filter topics based on selected Subject for the topic selection dropdown
     filtered_topics_for_update_selection = [
@@ -249,26 +242,19 @@ def topics_manage_page():
             current_subject_display_info = f"{current_subject_obj.get('subname', 'N/A')} (Level: {current_subject_obj.get('level', 'N/A')}, ID: {initial_subid})"
             st.info(f"Current Parent Subject: **{current_subject_display_info}**")
 
-            # Options for changing parent subject: "Keep Current" + all other subjects
-            change_subject_options = ["-- Keep Current Subject --"]
-            other_subjects = [s for s in all_subjects if s['subid'] != initial_subid]
-            # [START Change 1 - Enhanced Subject Display in New Selectbox]
-            change_subject_options.extend([
-                f"{s['subname']} (Level: {s.get('level', 'N/A')}, ID: {s['subid']})" for s in other_subjects
-            ])
-            # [END Change 1 - Enhanced Subject Display in New Selectbox]
+            # Options for changing parent subject: "Keep Current" (mapped to the current subject ID) + all other subjects
+            change_subject_options = {"-- Keep Current Subject --": initial_subid}
+            change_subject_options.update(
+                (display, subid) for display, subid in subject_display_to_id.items() if subid != initial_subid
+            )
             
             selected_new_subject_display = st.selectbox(
                 "Change Parent Subject (Optional)",
-                options=change_subject_options,
+                options=list(change_subject_options),
                 key="change_topic_parent_subject_select"
             )
 
-            new_subid_for_update = initial_subid # Default to current subject ID
-            if selected_new_subject_display != "-- Keep Current Subject --":
-                match = re.search(r"ID: (\d+)", selected_new_subject_display)
-                if match:
-                    new_subid_for_update = int(match.group(1))
+            new_subid_for_update = change_subject_options.get(selected_new_subject_display, initial_subid)
             # [END Change 2 - Display Current Parent Subject and allow changing it]
             
             updated_tname = st.text_input("New Topic Name", value=initial_tname, key="updated_topic_name_input")
@@ -328,6 +314,7 @@ def topics_manage_page():
                             result = update_topic(selected_topic_id, **update_payload)
                             if result:
                                 st.success(f"Topic ID {result['tid']} updated successfully!")
+                                clear_topics_cache()
                                 st.rerun()
                             else:
                                 st.error("Failed to update topic. Please check API logs.")
@@ -363,6 +350,7 @@ def topics_manage_page():
                     if success:
                         st.success(f"Topic ID {selected_topic_id_delete} deleted successfully!")
                         del st.session_state.confirm_delete_topic_id
+                        clear_topics_cache()
                         st.rerun()
                     else:
                         st.error("Failed to delete topic. Please check API logs.")
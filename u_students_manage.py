@@ -7,6 +7,7 @@ import re # Import the regular expression module
 # --- Configuration ---
 #API_BASE_URL = "http://localhost:5002" # Your Node.js API URL
 from config import API_BASE_URL
+from api_session import clear_endpoint_caches
 
 # --- API Interaction Functions for Students (via Users API) ---
 
@@ -297,6 +298,7 @@ def u_students_manage_page():
                         )
                         if result:
                             st.success(f"Gurukul and Milestone assignments updated successfully for {selected_student_obj['username']}!")
+                            clear_endpoint_caches('/students') # The direct student page lists these assignments
                             st.rerun() # Rerun to refresh display
                         else:
                             st.error("Failed to update assignments. Please check API logs.")
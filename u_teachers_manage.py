@@ -6,6 +6,7 @@ import pandas as pd
 # --- Configuration ---
 #API_BASE_URL = "http://localhost:5002" # Your Node.js API URL
 from config import API_BASE_URL
+from api_session import clear_endpoint_caches
 
 # --- API Interaction Functions (Adapted for User API based assignment) ---
 
@@ -184,6 +185,7 @@ def u_teachers_manage_page():
                     result = update_user_with_assignments(selected_teacher_user_id_for_crud, updated_subject_ids_payload)
                     if result:
                         st.success(f"All assignments for {selected_teacher_obj_for_crud['username']} updated successfully!")
+                        clear_endpoint_caches('/teachers') # The direct teacher page lists these assignments
                         st.rerun() # Rerun to refresh display
                     else:
                         st.error("Failed to update assignments. Please check API logs.")
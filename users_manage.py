@@ -6,6 +6,7 @@ import pandas as pd
 # --- Configuration ---
 #API_BASE_URL = "http://localhost:5002" # Your Node.js API URL
 from config import API_BASE_URL
+from api_session import clear_endpoint_caches
 
 # --- API Interaction Functions for Users ---
 
@@ -115,6 +116,7 @@ def users_manage_page():
                     result = create_user_general(new_username, new_email, new_password, new_role)
                     if result:
                         st.success(f"User '{result['username']}' (ID: {result['userid']}) created successfully as a {result['role']}!")
+                        clear_endpoint_caches('/teachers', '/students') # Users back the teacher and student lists on the direct pages
                         st.rerun()
                     else:
                         st.error("Failed to create user account. This might be a duplicate email or a backend validation error. Please check API logs for more details.")
@@ -199,6 +201,7 @@ def users_manage_page():
                             result = update_user_general(selected_user_id, **update_payload)
                             if result:
                                 st.success(f"User account ID {result['userid']} updated successfully!")
+                                clear_endpoint_caches('/teachers', '/students') # Users back the teacher and student lists on the direct pages
                                 st.rerun()
                             else:
                                 st.error("Failed to update user account. Please check API logs for details (e.g., duplicate email, validation errors).")
@@ -239,6 +242,7 @@ def users_manage_page():
                         if success:
                             st.success(f"User account ID {selected_user_id_delete} soft-deleted successfully!")
                             del st.session_state.confirm_delete_user_general_id
+                            clear_endpoint_caches('/teachers', '/students') # Users back the teacher and student lists on the direct pages
                             st.rerun()
                         else:
                             st.error("Failed to soft-delete user account. Please check API logs.")